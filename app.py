@@ -1,15 +1,22 @@
-from openai import OpenAI
 import os
-import edge_tts
 import json
 import asyncio
-import whisper_timestamped as whisper
-from utility.script.script_generator import generate_script
-from utility.audio.audio_generator import generate_audio
-from utility.captions.timed_captions_generator import generate_timed_captions
+from utility.script.script_generator import generate_script, script_model
+from utility.audio.audio_generator import generate_audio, generate_audio_chunked, VOICE
+from utility.audio.pcm import decode_audio
+from utility.captions.timed_captions_generator import (generate_timed_captions, preload_whisper_models,
+                                                       generate_timed_captions_from_word_boundaries,
+                                                       WordBoundaryCaptioner)
 from utility.video.background_video_generator import generate_video_url
-from utility.render.render_engine import get_output_media
-from utility.video.video_search_query_generator import getVideoSearchQueriesTimed, merge_empty_intervals
+from utility.render.render_engine import get_output_media, fetch_background_videos
+from utility.render.text_renderer import CAPTION_STYLE, CAPTION_Y
+from utility.video.video_search_query_generator import (getVideoSearchQueriesTimed, merge_empty_intervals,
+                                                        search_model)
+from utility.llm_cache import set_llm_cache_mode, get_llm_cache_mode
+from utility.profiling import Tracer, span, use_tracer, write_profile, print_summary
+from utility.pipeline.checkpoint import Checkpoint, checkpointed, file_fingerprint
+from utility.pipeline.batch import (load_batch_jobs, parse_stage_limits, run_batch, print_report,
+                                    DEFAULT_JOBS_IN_FLIGHT)
 import argparse
 
 # Load environment variables from .env file if it exists
@@ -19,66 +26,249 @@ try:
 except ImportError:
     pass
 
-# Get API keys from environment variables
-OPENAI_KEY = os.getenv("OPENAI_KEY")
-PEXELS_KEY = os.getenv("PEXELS_KEY")
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+VIDEO_SERVER = "pexel"
 
-if not all([OPENAI_KEY, PEXELS_KEY, GROQ_API_KEY]):
-    raise ValueError("Missing required API keys in environment variables")
 
-os.environ["OPENAI_KEY"] = OPENAI_KEY
-os.environ["PEXELS_KEY"] = PEXELS_KEY
-os.environ["GROQ_API_KEY"] = GROQ_API_KEY
+def check_api_keys():
+    """Fail fast before a run if an API key is missing from the environment"""
+    missing = [name for name in ("OPENAI_KEY", "PEXELS_KEY", "GROQ_API_KEY") if not os.getenv(name)]
+    if missing:
+        raise ValueError(f"Missing required API keys in environment variables: {', '.join(missing)}")
 
 
-def generate_video(topic, output_dir, orientation_landscape):
-    try:
-        # Create output directory if it doesn't exist
-        os.makedirs(output_dir, exist_ok=True)
+DEFAULT_OPTIONS = {
+    "caption_renderer": "pillow",
+    "renderer": "moviepy",
+    "render_workers": 1,
+    "alignment": "whisper",
+    "tts_concurrency": 1,
+    "normalize": True,
+    "target_size": None,
+    "prefetch": False,
+}
+
+
+def create_job(topic, output_dir, orientation_landscape, resume=True, **options):
+    job = {
+        "topic": topic,
+        "output_dir": output_dir,
+        "orientation_landscape": orientation_landscape,
+        "options": dict(DEFAULT_OPTIONS, **options),
+    }
+    # Create output directory if it doesn't exist
+    os.makedirs(output_dir, exist_ok=True)
+    job["audio_file"] = os.path.join(output_dir, "audio_tts.mp3")
+    job["output_video"] = os.path.join(output_dir, "output.mp4")
+    # Stage results are kept in output_dir/manifest.json so a rerun picks up where this one stopped
+    job["checkpoint"] = Checkpoint(output_dir, resume=resume)
+    return job
+
+
+def stage_script(job):
+    # Generate engaging script for the topic
+    job["script"] = generate_script(job["topic"])
+    print("Generated script successfully")
+
+
+def stage_prefetch(job):
+    # Start searching and downloading footage for the script while the narration is made
+    if not job["options"]["prefetch"]:
+        return
+    # Nothing to prefetch for if the search result will come from the manifest
+    checkpoint = job.get("checkpoint")
+    if checkpoint is not None and checkpoint.restorable(["tts", "captions", "search"], job, STAGE_CHECKPOINTS):
+        return
+    from utility.video.prefetch import FootagePrefetch
+    job["prefetch"] = FootagePrefetch(job["script"], job["orientation_landscape"]).start()
+
 
-        SAMPLE_FILE_NAME = os.path.join(output_dir, "audio_tts.wav")
-        VIDEO_SERVER = "pexel"
-        OUTPUT_VIDEO = os.path.join(output_dir, "output.mp4")
+def stage_tts(job):
+    # Generate audio narration
+    if job["options"]["tts_concurrency"] > 1:
+        # Synthesize sentences concurrently and join them in order, captioning
+        # each chunk from its word boundaries as soon as it is done
+        captioner = None
+        on_chunk = None
+        if job["options"]["alignment"] == "tts":
+            captioner = WordBoundaryCaptioner()
+            on_chunk = lambda chunk: captioner.add(chunk["word_boundaries"])
+        job["word_boundaries"] = asyncio.run(generate_audio_chunked(
+            job["script"], job["audio_file"], max_concurrency=job["options"]["tts_concurrency"],
+            on_chunk=on_chunk))
+        if captioner is not None:
+            job["streamed_captions"] = captioner.finish()
+    else:
+        job["word_boundaries"] = asyncio.run(generate_audio(job["script"], job["audio_file"]))
+    # Decode once; captions and the render read these samples instead of the MP3
+    decode_audio(job["audio_file"])
+    print("Generated audio successfully")
 
-        # Generate engaging script for the topic
-        response = generate_script(topic)
-        print("Generated script successfully")
 
-        # Generate audio narration
-        asyncio.run(generate_audio(response, SAMPLE_FILE_NAME))
-        print("Generated audio successfully")
+def stage_captions(job):
+    # Generate timed captions
+    if job["options"]["alignment"] == "tts":
+        # Word timings came with the narration, no transcription needed. They
+        # are already captioned if the narration was synthesized in chunks.
+        job["timed_captions"] = job.pop("streamed_captions", None)
+        if job["timed_captions"] is None:
+            job["timed_captions"] = generate_timed_captions_from_word_boundaries(job["word_boundaries"])
+    else:
+        job["timed_captions"] = generate_timed_captions(job["audio_file"])
+    print("Generated captions successfully")
 
-        # Generate timed captions
-        timed_captions = generate_timed_captions(SAMPLE_FILE_NAME)
-        print("Generated captions successfully")
 
+def stage_search(job):
+    # Use the footage prefetched from the script, if any
+    prefetch = job.pop("prefetch", None)
+    background_video_urls = prefetch.timed_video_urls(job["timed_captions"]) if prefetch else None
+
+    if background_video_urls is None:
         # Generate relevant video search terms
-        search_terms = getVideoSearchQueriesTimed(response, timed_captions)
+        search_terms = getVideoSearchQueriesTimed(job["script"], job["timed_captions"])
         if not search_terms:
             raise ValueError("Failed to generate search terms")
 
         # Get background video URLs
         background_video_urls = generate_video_url(
             search_terms,
-            orientation_landscape=orientation_landscape,
+            orientation_landscape=job["orientation_landscape"],
             video_server=VIDEO_SERVER,
         )
-        if not background_video_urls:
-            raise ValueError("Failed to get background videos")
+    if not background_video_urls:
+        raise ValueError("Failed to get background videos")
+
+    # Merge any empty intervals
+    job["background_video_urls"] = merge_empty_intervals(background_video_urls)
+
+
+def stage_download(job):
+    # Fetch the footage to local files so rendering does no network I/O
+    job["temp_files"] = []
+    video_files = fetch_background_videos([url for _, url in job["background_video_urls"]], job["temp_files"])
+    job["background_video_files"] = [[interval, video_file] for (interval, _), video_file
+                                     in zip(job["background_video_urls"], video_files)]
 
-        # Merge any empty intervals
-        background_video_urls = merge_empty_intervals(background_video_urls)
 
-        # Generate final video
-        video = get_output_media(
-            SAMPLE_FILE_NAME,
-            timed_captions,
-            background_video_urls,
+def stage_normalize(job):
+    # Trim and transcode the footage to the output size once, so the render only decodes small uniform clips
+    if not job["options"]["normalize"]:
+        job["render_video_files"] = job["background_video_files"]
+        return
+    from utility.render.normalize import get_target_size, normalize_background_videos
+    size = job["options"]["target_size"] or get_target_size(job["orientation_landscape"])
+    job["render_video_files"] = normalize_background_videos(job["background_video_files"], size)
+
+
+def stage_render(job):
+    # Generate final video
+    options = job["options"]
+    try:
+        get_output_media(
+            job["audio_file"],
+            job["timed_captions"],
+            job["render_video_files"],
             VIDEO_SERVER,
-            output_path=OUTPUT_VIDEO,
+            output_path=job["output_video"],
+            caption_renderer=options["caption_renderer"],
+            renderer=options["renderer"],
+            render_workers=options["render_workers"],
         )
-        print(f"Successfully generated video at: {OUTPUT_VIDEO}")
+    finally:
+        for temp_file in job.get("temp_files", []):
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+
+# What each stage's result depends on, what it produces and the files it writes.
+# Render settings only feed the render stage, so changing them redoes just the encode.
+# The LLM stages also run again when the LLM cache is being refreshed.
+STAGE_CHECKPOINTS = {
+    "script": {
+        "inputs": lambda job: [job["topic"], script_model()],
+        "outputs": ["script"],
+        "rerun": lambda job: get_llm_cache_mode() == "refresh",
+    },
+    "tts": {
+        "inputs": lambda job: [job["script"], job["options"]["tts_concurrency"], VOICE,
+                               os.environ.get("TTS_BACKEND", "edge")],
+        "outputs": ["word_boundaries"],
+        "files": lambda job: [job["audio_file"]],
+    },
+    "captions": {
+        "inputs": lambda job: [job["options"]["alignment"], job["word_boundaries"],
+                               file_fingerprint(job["audio_file"])],
+        "outputs": ["timed_captions"],
+    },
+    "search": {
+        "inputs": lambda job: [job["script"], job["timed_captions"], job["orientation_landscape"], VIDEO_SERVER,
+                               job["options"]["prefetch"], search_model()],
+        "outputs": ["background_video_urls"],
+        "rerun": lambda job: get_llm_cache_mode() == "refresh",
+    },
+    "download": {
+        "inputs": lambda job: [job["background_video_urls"]],
+        "outputs": ["background_video_files", "temp_files"],
+        "files": lambda job: [video_file for _, video_file in job["background_video_files"]],
+    },
+    "normalize": {
+        "inputs": lambda job: [job["background_video_files"],
+                               [file_fingerprint(video_file) for _, video_file in job["background_video_files"]],
+                               job["options"]["normalize"], job["options"]["target_size"],
+                               job["orientation_landscape"]],
+        "outputs": ["render_video_files"],
+        "files": lambda job: [video_file for _, video_file in job["render_video_files"]],
+    },
+    "render": {
+        "inputs": lambda job: [job["timed_captions"], job["render_video_files"],
+                               [file_fingerprint(video_file) for _, video_file in job["render_video_files"]],
+                               file_fingerprint(job["audio_file"]), job["options"]["caption_renderer"],
+                               job["options"]["renderer"], job["options"]["render_workers"], CAPTION_STYLE,
+                               CAPTION_Y],
+        "outputs": [],
+        "files": lambda job: [job["output_video"]],
+    },
+}
+
+# prefetch only starts a background search, so it has no checkpoint of its own
+PIPELINE_STAGES = [(name, checkpointed(name, stage, STAGE_CHECKPOINTS[name]) if name in STAGE_CHECKPOINTS else stage)
+                   for name, stage in [
+    ("script", stage_script),
+    ("prefetch", stage_prefetch),
+    ("tts", stage_tts),
+    ("captions", stage_captions),
+    ("search", stage_search),
+    ("download", stage_download),
+    ("normalize", stage_normalize),
+    ("render", stage_render),
+]]
+
+
+def finish_job(job):
+    # Stop a prefetch the job ended without using, so its thread does not outlive the job
+    prefetch = job.pop("prefetch", None)
+    if prefetch is not None:
+        prefetch.close()
+
+
+def save_profile(output_dir, tracers):
+    """Write the Chrome trace of the jobs to output_dir/profile.json and print their summaries"""
+    os.makedirs(output_dir, exist_ok=True)
+    profile_path = write_profile(os.path.join(output_dir, "profile.json"), tracers)
+    for tracer in tracers:
+        print_summary(tracer)
+    print(f"Profile written to: {profile_path}")
+
+
+def generate_video(topic, output_dir, orientation_landscape, profile=False, resume=True, **options):
+    tracer = Tracer(topic) if profile else None
+    job = None
+    try:
+        job = create_job(topic, output_dir, orientation_landscape, resume=resume, **options)
+        with use_tracer(tracer):
+            for name, stage in PIPELINE_STAGES:
+                with span(name, cat="stage"):
+                    stage(job)
+        print(f"Successfully generated video at: {job['output_video']}")
 
         return True
 
@@ -86,18 +276,104 @@ def generate_video(topic, output_dir, orientation_landscape):
         print(f"Error generating video: {str(e)}")
         return False
 
+    finally:
+        if job is not None:
+            finish_job(job)
+        if tracer is not None:
+            save_profile(output_dir, [tracer])
+
+
+def generate_batch(batch_file, output_dir, orientation, stage_limits=None, jobs_in_flight=DEFAULT_JOBS_IN_FLIGHT,
+                   profile=False, resume=True, **options):
+    """Generate a video for every topic in batch_file, pipelining jobs across stages"""
+    jobs = []
+    for entry in load_batch_jobs(batch_file, output_dir, orientation):
+        job_options = dict(options)
+        job_options.update({key: entry[key] for key in DEFAULT_OPTIONS if key in entry})
+        job = create_job(entry["topic"], entry["output_dir"], entry["orientation"] == "landscape", resume=resume,
+                         **job_options)
+        if profile:
+            job["tracer"] = Tracer(entry["topic"])
+        jobs.append(job)
+
+    # Pay for the Whisper model once, before the first job needs it
+    if any(job["options"]["alignment"] == "whisper" for job in jobs):
+        preload_whisper_models()
+
+    report = run_batch(jobs, PIPELINE_STAGES, stage_limits, jobs_in_flight, finish=finish_job)
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = os.path.join(output_dir, "batch_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"Batch report written to: {report_path}")
+    if profile:
+        save_profile(output_dir, [job["tracer"] for job in jobs])
+    return report["failed"] == 0
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate an engaging video from a topic.")
-    parser.add_argument("topic", type=str, help="The topic for the video")
+    parser.add_argument("topic", type=str, nargs="?", help="The topic for the video")
+    parser.add_argument("--batch", type=str,
+                        help="File of topics (one per line) or JSONL objects with topic/orientation/output_dir")
     parser.add_argument("--output-dir", type=str, default="output", help="Output directory for the generated files")
     parser.add_argument("--orientation", choices=["landscape", "portrait"], default="portrait",
                         help="Orientation of videos to fetch (default: portrait)")
+    parser.add_argument("--caption-renderer", choices=["pillow", "magick"], default="pillow",
+                        help="Render captions in-process with Pillow or with the ImageMagick CLI (default: pillow)")
+    parser.add_argument("--renderer", choices=["moviepy", "ffmpeg"], default="moviepy",
+                        help="Composite with MoviePy or compile the timeline into one ffmpeg filtergraph (default: moviepy)")
+    parser.add_argument("--render-workers", type=int, default=1,
+                        help="Encode chunks split at clip boundaries in this many processes (default: 1)")
+    parser.add_argument("--alignment", choices=["whisper", "tts"], default="whisper",
+                        help="Time captions by transcribing with Whisper or from the TTS word boundaries (default: whisper)")
+    parser.add_argument("--tts-concurrency", type=int, default=1,
+                        help="Synthesize the narration in sentence chunks, this many at a time (default: 1, whole script)")
+    parser.add_argument("--stage-limits", type=str, default="",
+                        help="Batch only: per-stage concurrency, e.g. script=4,tts=4,captions=1,render=2")
+    parser.add_argument("--llm-cache", choices=["on", "off", "refresh"], default=os.environ.get("LLM_CACHE", "on"),
+                        help="Reuse cached LLM responses (on), bypass the cache (off) or call the model and overwrite it (refresh)")
+    parser.add_argument("--target-size", type=str, default=None,
+                        help="Size the footage is normalized to before rendering, e.g. 720x1280 "
+                             "(default: 1080x1920 portrait, 1920x1080 landscape)")
+    parser.add_argument("--no-normalize", action="store_true",
+                        help="Render from the downloaded footage as is instead of normalized clips")
+    parser.add_argument("--prefetch", action="store_true",
+                        help="Search and download footage from the script's sentences while the narration and captions are made")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Ignore results saved in <output-dir>/manifest.json by an earlier run and redo every stage")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time every stage and write a Chrome trace with a summary to <output-dir>/profile.json")
+    parser.add_argument("--jobs-in-flight", type=int, default=DEFAULT_JOBS_IN_FLIGHT,
+                        help=f"Batch only: jobs in the pipeline at once (default: {DEFAULT_JOBS_IN_FLIGHT})")
 
     args = parser.parse_args()
-    orientation_landscape = args.orientation == "landscape"
-    print("orientation_landscape : ",orientation_landscape)
-    success = generate_video(args.topic, args.output_dir, orientation_landscape)
+    set_llm_cache_mode(args.llm_cache)
+    if not args.topic and not args.batch:
+        parser.error("a topic or --batch file is required")
+    check_api_keys()
+    options = {
+        "caption_renderer": args.caption_renderer,
+        "renderer": args.renderer,
+        "render_workers": args.render_workers,
+        "alignment": args.alignment,
+        "tts_concurrency": args.tts_concurrency,
+        "normalize": not args.no_normalize,
+        "target_size": tuple(int(n) for n in args.target_size.lower().split("x")) if args.target_size else None,
+        "prefetch": args.prefetch,
+    }
+
+    if args.batch:
+        success = generate_batch(args.batch, args.output_dir, args.orientation,
+                                 stage_limits=parse_stage_limits(args.stage_limits),
+                                 jobs_in_flight=args.jobs_in_flight, profile=args.profile,
+                                 resume=not args.fresh, **options)
+    else:
+        orientation_landscape = args.orientation == "landscape"
+        print("orientation_landscape : ",orientation_landscape)
+        success = generate_video(args.topic, args.output_dir, orientation_landscape, profile=args.profile,
+                                 resume=not args.fresh, **options)
 
     if not success:
         exit(1)
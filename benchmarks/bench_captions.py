@@ -0,0 +1,121 @@
+"""Caption timing benchmark on synthetic Whisper analyses.
+
+Compares the legacy quadratic segmentation and dict scan (getTimestampMapping
++ interpolateTimeFromDict) with a batch lookup in the sorted offset index
+(getTimestampIndex + interpolateTimesFromIndex) and with the single-pass
+offset walk used by getCaptionsWithTime.
+
+    python -m benchmarks.bench_captions --words 500 2000 8000
+"""
+import argparse
+import random
+import time
+
+from utility.captions.timed_captions_generator import (cleanWord, getCaptionsWithTime, getTimestampIndex,
+                                                       getTimestampMapping, interpolateTimeFromDict,
+                                                       interpolateTimesFromIndex, splitWordsBySize)
+
+VOCABULARY = ["ocean", "waves", "crash", "against", "the", "rocky", "shore", "while", "seagulls",
+              "circle", "overhead,", "and", "fishermen", "haul", "their", "nets.", "Did", "you",
+              "know", "octopuses", "have", "three", "hearts?", "Amazing!"]
+
+
+def make_whisper_analysis(n_words, words_per_segment=12, seed=0):
+    """Build a whisper_timestamped-shaped result with n_words words"""
+    rng = random.Random(seed)
+    segments = []
+    texts = []
+    t = 0.0
+    for start in range(0, n_words, words_per_segment):
+        words = []
+        for _ in range(min(words_per_segment, n_words - start)):
+            text = rng.choice(VOCABULARY)
+            duration = 0.15 + 0.05 * len(text) / 4
+            words.append({"text": text, "start": round(t, 2), "end": round(t + duration, 2)})
+            texts.append(text)
+            t += duration + 0.05
+        segments.append({"words": words})
+    return {"text": " " + " ".join(texts), "segments": segments}
+
+
+def legacy_split_words_by_size(words, maxCaptionSize):
+    """splitWordsBySize as it was before the single-pass rewrite"""
+    halfCaptionSize = maxCaptionSize / 2
+    captions = []
+    while words:
+        caption = words[0]
+        words = words[1:]
+        while words and len(caption + ' ' + words[0]) <= maxCaptionSize:
+            caption += ' ' + words[0]
+            words = words[1:]
+            if len(caption) >= halfCaptionSize and words:
+                break
+        captions.append(caption)
+    return captions
+
+
+def legacy_captions_with_time(whisper_analysis, maxCaptionSize=15):
+    """getCaptionsWithTime as it was before the offset lookup and segmentation rewrites"""
+    wordLocationToTime = getTimestampMapping(whisper_analysis)
+    position = 0
+    start_time = 0
+    CaptionsPairs = []
+    words = [cleanWord(word) for word in legacy_split_words_by_size(whisper_analysis['text'].split(),
+                                                                    maxCaptionSize)]
+    for word in words:
+        position += len(word) + 1
+        end_time = interpolateTimeFromDict(position, wordLocationToTime)
+        if end_time and word:
+            CaptionsPairs.append(((start_time, end_time), word))
+            start_time = end_time
+    return CaptionsPairs
+
+
+def indexed_captions_with_time(whisper_analysis, maxCaptionSize=15):
+    """Captions timed by looking every caption position up in the offset index in one call"""
+    words = [cleanWord(word) for word in splitWordsBySize(whisper_analysis['text'].split(), maxCaptionSize)]
+    positions = []
+    position = 0
+    for word in words:
+        position += len(word) + 1
+        positions.append(position)
+    start_time = 0
+    CaptionsPairs = []
+    for word, end_time in zip(words, interpolateTimesFromIndex(positions, getTimestampIndex(whisper_analysis))):
+        if end_time and word:
+            CaptionsPairs.append(((start_time, end_time), word))
+            start_time = end_time
+    return CaptionsPairs
+
+
+def best_of(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark caption timestamp lookup.")
+    parser.add_argument("--words", type=int, nargs="+", default=[500, 1000, 2000, 4000, 8000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'words':>8} {'captions':>9} {'legacy (s)':>11} {'indexed (s)':>12} {'streamed (s)':>12} "
+          f"{'speedup':>8}")
+    for n_words in args.words:
+        analysis = make_whisper_analysis(n_words)
+        legacy_time, legacy = best_of(lambda: legacy_captions_with_time(analysis), args.repeat)
+        indexed_time, indexed = best_of(lambda: indexed_captions_with_time(analysis), args.repeat)
+        streamed_time, streamed = best_of(lambda: getCaptionsWithTime(analysis), args.repeat)
+        if not legacy == indexed == streamed:
+            raise AssertionError(f"Caption output differs for {n_words} words")
+        print(f"{n_words:>8} {len(streamed):>9} {legacy_time:>11.4f} {indexed_time:>12.4f} {streamed_time:>12.4f} "
+              f"{legacy_time / max(streamed_time, 1e-9):>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""CLI startup benchmark with an import-time budget.
+
+Runs `python -X importtime` on app.py and the pipeline modules in fresh
+interpreters, reports the slowest imports and the wall time of
+`app.py --help`, and fails if startup goes over budget or pulls in a heavy
+dependency that should only load when its stage runs.
+
+    python -m benchmarks.bench_import_time --budget 0.5 --json import_time.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+MODULES = [
+    "app",
+    "utility.script.script_generator",
+    "utility.video.video_search_query_generator",
+    "utility.video.background_video_generator",
+    "utility.audio.audio_generator",
+    "utility.captions.timed_captions_generator",
+    "utility.render.render_engine",
+]
+
+# Only the stage that needs one of these may import it
+HEAVY_MODULES = ["torch", "whisper", "whisper_timestamped", "moviepy", "openai", "groq", "edge_tts", "numpy",
+                 "PIL"]
+
+
+def import_times(module, env):
+    """Cumulative import time in seconds for every module loaded by importing module"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            times[name.strip()] = int(cumulative) / 1e6
+        except ValueError:
+            continue  # Header line
+    return times
+
+
+def best_wall_time(cmd, env, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and CLI startup against a budget.")
+    parser.add_argument("--budget", type=float, default=0.5, help="Max seconds for `app.py --help` (default: 0.5)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    # No API keys, like a fresh checkout: startup must not need them
+    env = {key: value for key, value in os.environ.items()
+           if key not in ("OPENAI_KEY", "PEXELS_KEY", "GROQ_API_KEY")}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+
+    results = {"modules": {}, "budget_s": args.budget}
+    failures = []
+    for module in MODULES:
+        times = import_times(module, env)
+        heavy = sorted({name.split(".")[0] for name in times} & set(HEAVY_MODULES))
+        results["modules"][module] = {"import_s": round(times.get(module, 0.0), 4), "heavy_imports": heavy}
+        print(f"{module:<45} {times.get(module, 0.0) * 1000:>8.1f} ms" + (f"  loads {', '.join(heavy)}" if heavy else ""))
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at import time")
+
+    times = import_times("app", env)
+    slowest = sorted(((name, seconds) for name, seconds in times.items() if name != "app"),
+                     key=lambda item: item[1], reverse=True)[:args.top]
+    print(f"\nSlowest imports under app:")
+    for name, seconds in slowest:
+        print(f"  {name:<43} {seconds * 1000:>8.1f} ms")
+    results["slowest"] = [{"module": name, "import_s": round(seconds, 4)} for name, seconds in slowest]
+
+    help_time = best_wall_time([sys.executable, "app.py", "--help"], env, args.repeat)
+    results["help_wall_s"] = round(help_time, 4)
+    print(f"\napp.py --help: {help_time:.3f}s (budget {args.budget:.3f}s)")
+    if help_time > args.budget:
+        failures.append(f"app.py --help took {help_time:.3f}s, over the {args.budget:.3f}s budget")
+
+    results["failures"] = failures
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Offline end-to-end benchmark of generate_video and its stages.
+
+Runs against the stub LLM and Pexels server from benchmarks/stubs.py, the
+fake TTS backend and a synthetic footage clip, so results are reproducible
+without network access or API keys. For each script length it times every
+stage on its own (script, tts, captions, search queries, getBestVideo,
+downloads, normalization, get_output_media) and then a full generate_video. Each scenario
+runs in a fresh process with empty caches so peak RSS is its own. Captions
+are timed from the TTS word boundaries, since Whisper needs model weights.
+
+    python -m benchmarks.bench_pipeline --sentences 3 6 12 --json results.json
+    python -m benchmarks.bench_pipeline --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+from benchmarks.bench_render import cpu_seconds, make_clip
+from benchmarks.stubs import StubServer
+
+TOPIC = "deep sea creatures"
+
+
+def peak_rss_mb():
+    from utility.profiling import peak_rss_mb
+    peak = peak_rss_mb()
+    return round(peak, 1) if peak is not None else None
+
+
+def format_mb(value):
+    return f"{value:.0f} MB" if value is not None else "n/a"
+
+
+def isolate(work_dir, environ):
+    """Point this process at the stub server and at empty caches under work_dir"""
+    os.environ.update(environ)
+    os.environ.update({
+        "TTS_BACKEND": "fake",
+        "FOOTAGE_CACHE_DIR": os.path.join(work_dir, "footage"),
+        "NORMALIZED_CACHE_DIR": os.path.join(work_dir, "normalized"),
+        "SEARCH_CACHE_DB": os.path.join(work_dir, "pexels_search.sqlite"),
+        "FOOTAGE_INDEX_DB": os.path.join(work_dir, "footage_index.sqlite"),
+        "LLM_CACHE_DB": os.path.join(work_dir, "llm_cache.sqlite"),
+        # The stub answers instantly; don't let the production rate limits dominate
+        "LLM_RATE_LIMIT": "100",
+        "PEXELS_RATE_LIMIT": "100",
+        "PEXELS_MAX_IN_FLIGHT": "8",
+    })
+    os.chdir(work_dir)
+
+
+def timed(stages, name, fn, amount=None, unit=None):
+    cpu_start = cpu_seconds()
+    start = time.perf_counter()
+    result = fn()
+    wall = time.perf_counter() - start
+    stages[name] = {"wall_s": round(wall, 4), "cpu_s": round(cpu_seconds() - cpu_start, 4),
+                    "peak_rss_mb": peak_rss_mb()}
+    if amount is not None:
+        stages[name]["throughput"] = round(amount(result) / wall, 2) if wall else None
+        stages[name]["throughput_unit"] = unit
+    return result
+
+
+def run_stages(work_dir, environ, renderer, size):
+    """Each stage function on its own, feeding the next, with cold caches"""
+    isolate(work_dir, environ)
+    from utility.script.script_generator import generate_script
+    from utility.audio.audio_generator import generate_audio
+    from utility.captions.timed_captions_generator import generate_timed_captions_from_word_boundaries
+    from utility.video.video_search_query_generator import getVideoSearchQueriesTimed, merge_empty_intervals
+    from utility.video.background_video_generator import generate_video_url
+    from utility.render.render_engine import fetch_background_videos, get_output_media
+    from utility.render.normalize import normalize_background_videos
+
+    stages = {}
+    script = timed(stages, "script", lambda: generate_script(TOPIC))
+    audio_file = os.path.join(work_dir, "audio_tts.mp3")
+    word_boundaries = timed(stages, "tts", lambda: asyncio.run(generate_audio(script, audio_file)),
+                            lambda result: len(result), "words/s")
+    captions = timed(stages, "captions", lambda: generate_timed_captions_from_word_boundaries(word_boundaries),
+                     lambda result: len(word_boundaries), "words/s")
+    search_terms = timed(stages, "search_queries", lambda: getVideoSearchQueriesTimed(script, captions))
+    urls = timed(stages, "get_best_video", lambda: generate_video_url(search_terms, False),
+                 lambda result: len(result), "segments/s")
+    urls = merge_empty_intervals(urls)
+    files = timed(stages, "download", lambda: fetch_background_videos([url for _, url in urls], []),
+                  lambda result: len(result), "clips/s")
+    duration = captions[-1][0][1]
+    normalized = timed(stages, "normalize", lambda: normalize_background_videos(
+        [[interval, f] for (interval, _), f in zip(urls, files)], size), lambda result: len(result), "clips/s")
+    output_path = os.path.join(work_dir, "output.mp4")
+    timed(stages, "render", lambda: get_output_media(audio_file, captions, normalized, "pexel",
+                                                     output_path=output_path, renderer=renderer),
+          lambda result: duration, "video s/s")
+    return {"scenario": "stages", "words": len(script.split()), "video_s": round(duration, 2),
+            "wall_s": round(sum(stage["wall_s"] for stage in stages.values()), 4),
+            "peak_rss_mb": peak_rss_mb(), "stages": stages}
+
+
+def run_pipeline(work_dir, environ, renderer, size):
+    """A full generate_video with --profile, stage timings taken from its trace"""
+    isolate(work_dir, environ)
+    import app
+
+    output_dir = os.path.join(work_dir, "output")
+    cpu_start = cpu_seconds()
+    start = time.perf_counter()
+    if not app.generate_video(TOPIC, output_dir, False, profile=True, alignment="tts", renderer=renderer,
+                              target_size=size):
+        raise RuntimeError("generate_video failed")
+    wall = time.perf_counter() - start
+    with open(os.path.join(output_dir, "profile.json")) as f:
+        spans = json.load(f)["summaries"][0]["spans"]
+    stages = {name: {"wall_s": row["total_s"], "count": row["count"]} for name, row in spans.items()}
+    from utility.render.ffmpeg_engine import probe_media
+    video_s = probe_media(os.path.join(output_dir, "output.mp4"))["duration"]
+    return {"scenario": "pipeline", "video_s": video_s, "wall_s": round(wall, 4),
+            "cpu_s": round(cpu_seconds() - cpu_start, 4), "peak_rss_mb": peak_rss_mb(),
+            "videos_per_hour": round(3600 / wall, 1), "realtime_factor": round(video_s / wall, 3),
+            "stages": stages}
+
+
+def run_isolated(target, *args):
+    """Run target in a fresh interpreter so imports, caches and peak RSS start clean"""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(target, args)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["scenario"], r["sentences"]): r for r in baseline["results"]}
+    print(f"Compared with {baseline_path} (commit {baseline.get('commit')}):")
+    for result in results:
+        before = previous.get((result["scenario"], result["sentences"]))
+        if before is None:
+            continue
+        print(f"  {result['scenario']:>8} {result['sentences']:>3} sentences: wall {before['wall_s']:.2f}s -> "
+              f"{result['wall_s']:.2f}s ({result['wall_s'] / before['wall_s']:.2f}x), peak RSS "
+              f"{format_mb(before['peak_rss_mb'])} -> {format_mb(result['peak_rss_mb'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the whole pipeline offline against local stubs.")
+    parser.add_argument("--sentences", type=int, nargs="+", default=[3, 6, 12],
+                        help="Script lengths to try, in sentences of ten words")
+    parser.add_argument("--scenarios", nargs="+", choices=["stages", "pipeline"], default=["stages", "pipeline"])
+    parser.add_argument("--renderer", choices=["moviepy", "ffmpeg"], default="ffmpeg")
+    parser.add_argument("--size", type=int, nargs=2, default=[1080, 1920], help="Synthetic footage size")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", help="Results file from an earlier run to compare against")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    footage = make_clip(os.path.join(work_dir, "footage.mp4"), 12, args.size)
+    targets = {"stages": run_stages, "pipeline": run_pipeline}
+    results = []
+    with StubServer(footage=footage) as server:
+        for sentences in args.sentences:
+            server.script_sentences = sentences
+            for scenario in args.scenarios:
+                scenario_dir = os.path.join(work_dir, f"{scenario}_{sentences}")
+                os.makedirs(scenario_dir)
+                result = run_isolated(targets[scenario], scenario_dir, server.environ(), args.renderer,
+                                      tuple(args.size))
+                result["sentences"] = sentences
+                results.append(result)
+                print(f"{scenario:>8} {sentences:>3} sentences: wall {result['wall_s']:.2f}s, "
+                      f"video {result['video_s']:.1f}s, peak RSS {format_mb(result['peak_rss_mb'])}")
+                for name, stage in result["stages"].items():
+                    throughput = f"  {stage['throughput']} {stage['throughput_unit']}" if stage.get("throughput") else ""
+                    print(f"      {name:<20} {stage['wall_s']:>8.3f}s{throughput}")
+        stub_stats = server.get_stats()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {"renderer": args.renderer, "footage_size": args.size, "topic": TOPIC},
+        "stub_requests": stub_stats,
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
+    if args.compare:
+        compare(results, args.compare)
+    print(f"Inputs and outputs kept in {work_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Render backend benchmark on synthetic inputs.
+
+Generates test-pattern background clips, a tone narration track and timed
+captions, then renders the same timeline with the MoviePy and ffmpeg
+backends of get_output_media, reporting wall time and CPU time (this process
+plus its ffmpeg children). --workers also tries segment-parallel rendering.
+
+    python -m benchmarks.bench_render --duration 30 --segments 8 --workers 1 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+from utility.profiling import process_resources
+from utility.render.ffmpeg_engine import get_ffmpeg_binary, probe_media
+from utility.render.render_engine import get_output_media
+
+
+def make_clip(path, duration, size, fps=25, pattern="testsrc2"):
+    subprocess.run([get_ffmpeg_binary(), '-y', '-loglevel', 'error', '-f', 'lavfi',
+                    '-i', f"{pattern}=s={size[0]}x{size[1]}:r={fps}:d={duration}",
+                    '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', path], check=True)
+    return path
+
+
+def make_audio(path, duration):
+    subprocess.run([get_ffmpeg_binary(), '-y', '-loglevel', 'error', '-f', 'lavfi',
+                    '-i', f"sine=frequency=220:duration={duration}", '-c:a', 'libmp3lame', path], check=True)
+    return path
+
+
+def make_inputs(work_dir, duration, segments, size):
+    audio_path = make_audio(os.path.join(work_dir, "narration.mp3"), duration)
+    segment_length = duration / segments
+    background_video_data = []
+    for n in range(segments):
+        t1, t2 = n * segment_length, (n + 1) * segment_length
+        pattern = "testsrc2" if n % 2 == 0 else "smptebars"
+        clip = make_clip(os.path.join(work_dir, f"clip_{n}.mp4"), min(20, segment_length + 2), size,
+                         pattern=pattern)
+        background_video_data.append([[t1, t2], clip])
+    timed_captions = []
+    caption_length = 0.6
+    t = 0.0
+    n = 0
+    while t + caption_length <= duration:
+        timed_captions.append(((t, t + caption_length), f"caption number {n}"))
+        t += caption_length
+        n += 1
+    return audio_path, timed_captions, background_video_data
+
+
+def cpu_seconds():
+    """CPU time of this process and its exited children, or of this process alone where getrusage is missing"""
+    resources = process_resources()
+    if not resources:
+        return time.process_time()
+    return resources["cpu_user_s"] + resources["cpu_system_s"] + resources["children_cpu_s"]
+
+
+def measure(renderer, audio_path, timed_captions, background_video_data, output_path, render_workers=1):
+    cpu_start = cpu_seconds()
+    wall_start = time.perf_counter()
+    get_output_media(audio_path, timed_captions, background_video_data, "pexel",
+                     output_path=output_path, renderer=renderer, render_workers=render_workers)
+    wall = time.perf_counter() - wall_start
+    cpu = cpu_seconds() - cpu_start
+    info = probe_media(output_path)
+    return {"renderer": renderer, "render_workers": render_workers, "wall_s": round(wall, 3),
+            "cpu_s": round(cpu, 3), "output_duration_s": info['duration'], "output_size": list(info['video_size'])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the MoviePy and ffmpeg render backends.")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--segments", type=int, default=8)
+    parser.add_argument("--size", type=int, nargs=2, default=[1080, 1920])
+    parser.add_argument("--renderers", nargs="+", default=["moviepy", "ffmpeg"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1],
+                        help="Render worker counts to try for each renderer")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_render_")
+    inputs = make_inputs(work_dir, args.duration, args.segments, args.size)
+    results = []
+    for renderer in args.renderers:
+        for workers in args.workers:
+            output_path = os.path.join(work_dir, f"output_{renderer}_{workers}.mp4")
+            result = measure(renderer, *inputs, output_path, render_workers=workers)
+            results.append(result)
+            print(f"{renderer:>8} x{workers}: wall {result['wall_s']:.2f}s, cpu {result['cpu_s']:.2f}s, "
+                  f"output {result['output_duration_s']}s {result['output_size']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"duration": args.duration, "segments": args.segments, "results": results}, f, indent=2)
+    print(f"Inputs and outputs kept in {work_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Local stand-ins for the LLM and Pexels APIs.
+
+One threaded HTTP server answers OpenAI-style chat completions, Pexels video
+searches and footage downloads, with configurable latency and injected 429s,
+so the pipeline and the provider layer can be exercised offline:
+
+    python -m benchmarks.stubs --port 8765 --footage clip.mp4 --error-rate 0.1
+
+then run app.py with the environment it prints.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubServer:
+    """Serve the stub APIs on 127.0.0.1 from a background thread.
+
+    latency delays every response by that many seconds, error_rate answers a
+    random fraction of API requests with 429 and a Retry-After of retry_after
+    seconds, and footage is the file served for every video download.
+    """
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, retry_after=0.05, footage=None,
+                 script_sentences=6, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.footage = footage
+        self.script_sentences = script_sentences
+        self.stats = {"chat": 0, "search": 0, "download": 0, "throttled": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def environ(self):
+        """Environment pointing app.py at this server"""
+        return {
+            "OPENAI_KEY": "stub",
+            "OPENAI_BASE_URL": f"{self.base_url}/v1",
+            "GROQ_API_KEY": "stub",  # Too short to select Groq, so the OpenAI client is used
+            "PEXELS_KEY": "stub",
+            "PEXELS_API_URL": self.base_url,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _throttle(self):
+        with self._lock:
+            throttled = self._random.random() < self.error_rate
+            if throttled:
+                self.stats["throttled"] += 1
+        return throttled
+
+    def chat_completion(self, body):
+        messages = body.get("messages", [])
+        user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        if "Timed Captions:" in user:
+            content = json.dumps(self.search_keywords(user))
+        elif user.startswith("Script:"):
+            content = json.dumps(self.sentence_keywords(user))
+        else:
+            content = json.dumps({"script": self.script(user)})
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    def script(self, topic):
+        words = re.findall(r"\w+", topic.lower()) or ["facts"]
+        return " ".join(f"Fact number {n + 1} about {' '.join(words)} is surprisingly interesting to hear."
+                        for n in range(self.script_sentences))
+
+    def sentence_keywords(self, user_content):
+        """One keyword per sentence of the script, from its words"""
+        sentences = re.split(r"(?<=[.!?])\s+", user_content[len("Script:"):].strip())
+        keywords = []
+        for sentence in filter(None, sentences):
+            words = re.findall(r"[a-z]+", sentence.lower()) or ["nature"]
+            keywords.append(f"{words[-1]} {words[len(words) // 2]} {len(keywords)}")
+        return keywords
+
+    def search_keywords(self, user_content):
+        """Four-second segments covering the captions, keyed on their words"""
+        captions = json.loads(user_content.split("Timed Captions:", 1)[1])
+        end = captions[-1][0][1] if captions else 0
+        segments = []
+        t = captions[0][0][0] if captions else 0.0
+        while t < end:
+            t2 = min(end, t + 4)
+            text = " ".join(caption for (c1, c2), caption in captions if c1 < t2 and c2 > t)
+            words = re.findall(r"[a-z]+", text.lower()) or ["nature"]
+            segments.append([[t, t2], [f"{words[0]} {words[-1]} {len(segments)}",
+                                       f"{words[len(words) // 2]} scene {len(segments)}"]])
+            t = t2
+        return segments
+
+    def search(self, params):
+        query = params.get("query", [""])[0]
+        landscape = params.get("orientation", ["portrait"])[0] == "landscape"
+        width, height = (1920, 1080) if landscape else (1080, 1920)
+        per_page = int(params.get("per_page", ["15"])[0])
+        videos = []
+        for n in range(min(per_page, 5)):
+            video_id = int(hashlib.sha1(f"{query}/{n}".encode()).hexdigest()[:8], 16)
+            link = f"{self.base_url}/video-files/{video_id}/{video_id}-hd_{width}_{height}_25fps.mp4"
+            videos.append({
+                "id": video_id, "width": width, "height": height, "duration": 8 + n,
+                "url": f"https://www.pexels.com/video/{'-'.join(query.lower().split())}-{video_id}/",
+                "video_files": [
+                    {"quality": "hd", "width": width, "height": height, "link": link},
+                    {"quality": "sd", "width": width // 2, "height": height // 2,
+                     "link": link.replace("-hd_", "-sd_")},
+                ],
+            })
+        return {"page": 1, "per_page": per_page, "total_results": len(videos), "videos": videos}
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    return self.send_json({"error": "not found"}, 404)
+                stub._count("chat")
+                if self.delay_or_throttle():
+                    return
+                self.send_json(stub.chat_completion(body))
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/videos/search":
+                    stub._count("search")
+                    if self.delay_or_throttle():
+                        return
+                    return self.send_json(stub.search(parse_qs(url.query)))
+                if url.path.startswith("/video-files/") and stub.footage:
+                    stub._count("download")
+                    with open(stub.footage, "rb") as f:
+                        data = f.read()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "video/mp4")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                self.send_json({"error": "not found"}, 404)
+
+            def delay_or_throttle(self):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub._throttle():
+                    self.send_json({"error": "rate limited"}, 429, {"Retry-After": str(stub.retry_after)})
+                    return True
+                return False
+
+            def send_json(self, payload, status=200, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stub LLM and Pexels APIs for offline runs.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of API requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.05)
+    parser.add_argument("--footage", help="Video file served for every download")
+    args = parser.parse_args()
+
+    server = StubServer(args.port, args.latency, args.error_rate, args.retry_after, args.footage)
+    for name, value in server.environ().items():
+        print(f"export {name}={value}")
+    print(f"Serving on {server.base_url}, Ctrl+C to stop")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,161 @@
-import edge_tts
+import os
+import re
+import asyncio
+import inspect
+from utility.providers import get_provider
+from utility.profiling import span
 
-async def generate_audio(text,outputFilename):
-    communicate = edge_tts.Communicate(text,"en-AU-WilliamNeural")
-    await communicate.save(outputFilename)
+VOICE = "en-AU-WilliamNeural"
 
+# edge-tts reports offsets and durations in 100 ns ticks
+TICKS_PER_SECOND = 10_000_000
 
+# Sentence chunks synthesized at once by generate_audio_chunked
+TTS_CONCURRENCY = 4
 
 
+class EdgeTTSBackend:
+    """Microsoft Edge online TTS, returning MP3 audio and word boundaries"""
 
+    # edge-tts streams audio-24khz-48kbitrate-mono-mp3, a constant bitrate
+    bitrate = 48000
+
+    def __init__(self, voice=VOICE):
+        self.voice = voice
+
+    async def synthesize(self, text):
+        return await get_provider("tts").acall(self._synthesize, text)
+
+    async def _synthesize(self, text):
+        import edge_tts
+        communicate = edge_tts.Communicate(text, self.voice)
+        audio = bytearray()
+        word_boundaries = []
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                audio += chunk["data"]
+            elif chunk["type"] == "WordBoundary":
+                word_boundaries.append({
+                    "text": chunk["text"],
+                    "start": chunk["offset"] / TICKS_PER_SECOND,
+                    "end": (chunk["offset"] + chunk["duration"]) / TICKS_PER_SECOND,
+                })
+        return bytes(audio), word_boundaries
+
+
+class FakeTTSBackend:
+    """Offline stand-in that "speaks" silent MP3 at a fixed word rate.
+
+    Output has the same format as EdgeTTSBackend (24 kHz mono 48 kbps MP3
+    frames of 24 ms) with evenly spaced word boundaries, so everything
+    downstream can run without network access.
+    """
+
+    bitrate = 48000
+    # MPEG-2 layer III, 48 kbps, 24 kHz, mono, no CRC; an all-zero body decodes to silence
+    FRAME = bytes([0xFF, 0xF3, 0x64, 0xC0]) + bytes(140)
+    FRAME_SECONDS = 576 / 24000
+
+    def __init__(self, words_per_second=2.5, latency=0.0):
+        self.words_per_second = words_per_second
+        self.latency = latency
+
+    async def synthesize(self, text):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        words = text.split()
+        word_length = 1 / self.words_per_second
+        word_boundaries = [{"text": re.sub(r'[^\w\-\']', '', word) or word,
+                            "start": n * word_length,
+                            "end": (n + 0.8) * word_length} for n, word in enumerate(words)]
+        frames = int(len(words) * word_length / self.FRAME_SECONDS) + 1
+        return self.FRAME * frames, word_boundaries
+
+
+def get_tts_backend(name=None):
+    """TTS backend by name ("edge" or "fake"), defaulting to the TTS_BACKEND environment variable"""
+    name = name or os.environ.get("TTS_BACKEND", "edge")
+    if name == "fake":
+        return FakeTTSBackend()
+    if name == "edge":
+        return EdgeTTSBackend()
+    raise ValueError(f"Unknown TTS backend: {name}")
+
+
+async def generate_audio(text,outputFilename, backend=None):
+    """Synthesize text to outputFilename and return the spoken word timings.
+
+    The word boundaries the TTS backend reports alongside the audio are
+    returned as [{"text", "start", "end"}] in seconds, enough to time captions
+    without transcribing the audio again.
+    """
+    backend = backend or get_tts_backend()
+    with span("tts_synthesize", cat="tts", words=len(text.split())):
+        audio, word_boundaries = await backend.synthesize(text)
+    with open(outputFilename, "wb") as f:
+        f.write(audio)
+    return word_boundaries
+
+
+def split_sentences(text):
+    return [sentence for sentence in re.split(r'(?<=[.!?])\s+', text.strip()) if sentence]
+
+
+async def iter_audio_chunks(text, backend=None, max_concurrency=TTS_CONCURRENCY):
+    """Synthesize text sentence by sentence, concurrently, yielding chunks in order.
+
+    Each chunk is a dict with its index, offset and duration in the joined
+    narration, the audio bytes and word boundaries already shifted to the
+    joined timeline. A chunk is yielded as soon as it and every chunk before
+    it are done, while later sentences are still being synthesized.
+    """
+    backend = backend or get_tts_backend()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def synthesize(sentence):
+        async with semaphore:
+            with span("tts_synthesize", cat="tts", words=len(sentence.split())):
+                return await backend.synthesize(sentence)
+
+    tasks = [asyncio.ensure_future(synthesize(sentence)) for sentence in split_sentences(text)]
+    try:
+        offset = 0.0
+        for index, task in enumerate(tasks):
+            audio, word_boundaries = await task
+            # Constant bitrate MP3, so the byte count gives the exact duration
+            duration = len(audio) * 8 / backend.bitrate
+            yield {
+                "index": index,
+                "offset": offset,
+                "duration": duration,
+                "audio": audio,
+                "word_boundaries": [{"text": boundary["text"],
+                                     "start": boundary["start"] + offset,
+                                     "end": boundary["end"] + offset} for boundary in word_boundaries],
+            }
+            offset += duration
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def generate_audio_chunked(text, outputFilename, backend=None, max_concurrency=TTS_CONCURRENCY,
+                                 on_chunk=None):
+    """Like generate_audio, but synthesizes sentences concurrently.
+
+    Chunks are appended to outputFilename in order as they complete and passed
+    to on_chunk (a function or coroutine function), so downstream work can
+    start before the whole narration exists. Returns the word boundaries of
+    the joined narration.
+    """
+    word_boundaries = []
+    with open(outputFilename, "wb") as f:
+        async for chunk in iter_audio_chunks(text, backend, max_concurrency):
+            f.write(chunk["audio"])
+            f.flush()
+            word_boundaries.extend(chunk["word_boundaries"])
+            if on_chunk is not None:
+                result = on_chunk(chunk)
+                if inspect.isawaitable(result):
+                    await result
+    return word_boundaries
@@ -0,0 +1,92 @@
+import os
+import threading
+import subprocess
+from utility.profiling import span
+
+# Narration is decoded once to raw float32 samples at the rate and channel
+# layout MoviePy mixes in, and every consumer reads that file. The same
+# decoder run writes the mono 16 kHz samples Whisper transcribes.
+PCM_SAMPLE_RATE = 44100
+PCM_CHANNELS = 2
+PCM_FORMAT = "f32le"
+PCM_DTYPE = "<f4"
+WHISPER_SAMPLE_RATE = 16000
+
+_decode_lock = threading.Lock()
+
+
+def pcm_path(audio_file_path):
+    return os.path.splitext(audio_file_path)[0] + ".pcm"
+
+
+def whisper_pcm_path(audio_file_path):
+    return os.path.splitext(audio_file_path)[0] + f".{WHISPER_SAMPLE_RATE // 1000}k.pcm"
+
+
+def decode_audio(audio_file_path):
+    """Path of audio_file_path decoded to raw PCM, decoding it only if a PCM file is missing or older.
+
+    One ffmpeg run writes both the mixing samples and Whisper's mono 16 kHz samples.
+    """
+    from utility.render.ffmpeg_engine import get_ffmpeg_binary
+    path = pcm_path(audio_file_path)
+    whisper_path = whisper_pcm_path(audio_file_path)
+    with _decode_lock:
+        try:
+            source_mtime = os.stat(audio_file_path).st_mtime_ns
+            if min(os.stat(path).st_mtime_ns, os.stat(whisper_path).st_mtime_ns) >= source_mtime:
+                return path
+        except FileNotFoundError:
+            pass
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        whisper_temp_path = f"{whisper_path}.{os.getpid()}.tmp"
+        with span("audio_decode", cat="audio", source=os.path.basename(audio_file_path)):
+            subprocess.run([get_ffmpeg_binary(), '-y', '-loglevel', 'error', '-i', audio_file_path,
+                            '-map', '0:a', '-ac', str(PCM_CHANNELS), '-ar', str(PCM_SAMPLE_RATE),
+                            '-f', PCM_FORMAT, temp_path,
+                            '-map', '0:a', '-ac', '1', '-ar', str(WHISPER_SAMPLE_RATE),
+                            '-f', PCM_FORMAT, whisper_temp_path],
+                           check=True)
+        os.replace(whisper_temp_path, whisper_path)
+        os.replace(temp_path, path)
+        return path
+
+
+def load_pcm(audio_file_path):
+    """Samples of audio_file_path as a read-only memory-mapped (frames, channels) float32 array"""
+    import numpy as np
+    path = decode_audio(audio_file_path)
+    if os.path.getsize(path) == 0:
+        return np.zeros((0, PCM_CHANNELS), dtype=PCM_DTYPE)
+    return np.memmap(path, dtype=PCM_DTYPE, mode="r").reshape(-1, PCM_CHANNELS)
+
+
+def audio_duration(audio_file_path):
+    """Exact length of audio_file_path in seconds, from the size of its PCM file"""
+    frame_bytes = 4 * PCM_CHANNELS
+    return os.path.getsize(decode_audio(audio_file_path)) // frame_bytes / PCM_SAMPLE_RATE
+
+
+def whisper_audio(audio_file_path):
+    """Mono 16 kHz float32 samples of audio_file_path, the input Whisper would decode for itself"""
+    import numpy as np
+    decode_audio(audio_file_path)
+    path = whisper_pcm_path(audio_file_path)
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=PCM_DTYPE)
+    # Copy-on-write, so Whisper may modify the array without touching the file
+    return np.memmap(path, dtype=PCM_DTYPE, mode="c")
+
+
+def audio_clip(audio_file_path):
+    """MoviePy clip playing the PCM samples of audio_file_path, without another decoder process"""
+    from moviepy.audio.AudioClip import AudioArrayClip
+    clip = AudioArrayClip(load_pcm(audio_file_path), fps=PCM_SAMPLE_RATE)
+    # AudioArrayClip leaves end unset, which CompositeAudioClip needs for its duration
+    return clip.set_duration(clip.duration)
+
+
+def ffmpeg_audio_input(audio_file_path):
+    """ffmpeg arguments reading the PCM samples of audio_file_path as an input"""
+    return ['-f', PCM_FORMAT, '-ar', str(PCM_SAMPLE_RATE), '-ac', str(PCM_CHANNELS),
+            '-i', decode_audio(audio_file_path)]
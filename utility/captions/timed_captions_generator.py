@@ -1,28 +1,164 @@
-import whisper_timestamped as whisper
-from whisper_timestamped import load_model, transcribe_timestamped
+from collections import OrderedDict, deque
+from bisect import bisect_left
+import threading
 import re
+from utility.profiling import span
 
-def generate_timed_captions(audio_filename,model_size="base"):
-    WHISPER_MODEL = load_model(model_size)
+# Whisper models kept resident per process, keyed by (model_size, device). The
+# dtype only picks fp16 decoding at transcribe time, so it shares the model.
+MAX_LOADED_MODELS = 2
+_loaded_models = OrderedDict()
+_models_lock = threading.Lock()
+
+def get_whisper_model(model_size="base", device=None):
+    """Return a loaded Whisper model, loading it only once per process"""
+    key = (model_size, device)
+    with _models_lock:
+        if key in _loaded_models:
+            _loaded_models.move_to_end(key)
+            return _loaded_models[key]
+
+        # Whisper (and torch) are only needed for this alignment mode
+        from whisper_timestamped import load_model
+        with span("whisper_load", cat="captions", model_size=model_size):
+            model = load_model(model_size, device=device)
+        _loaded_models[key] = model
+        # Evict the least recently used models beyond the limit
+        while len(_loaded_models) > MAX_LOADED_MODELS:
+            _loaded_models.popitem(last=False)
+        return model
+
+def preload_whisper_models(model_sizes=("base",), device=None):
+    """Load models up front so a long-running worker pays the cost at startup"""
+    for model_size in model_sizes:
+        get_whisper_model(model_size, device=device)
+
+def clear_whisper_models():
+    with _models_lock:
+        _loaded_models.clear()
+
+def generate_timed_captions(audio_filename,model_size="base", device=None, dtype="float32"):
+    from whisper_timestamped import transcribe_timestamped
+    from utility.audio.pcm import whisper_audio
+    WHISPER_MODEL = get_whisper_model(model_size, device=device)
    
-    gen = transcribe_timestamped(WHISPER_MODEL, audio_filename, verbose=False, fp16=False)
+    with span("whisper_transcribe", cat="captions", model_size=model_size):
+        # Samples from the shared PCM decode, so Whisper doesn't run ffmpeg on the file again
+        gen = transcribe_timestamped(WHISPER_MODEL, whisper_audio(audio_filename), verbose=False,
+                                     fp16=(dtype == "float16"))
    
     return getCaptionsWithTime(gen)
 
-def splitWordsBySize(words, maxCaptionSize):
-   
+def generate_timed_captions_from_word_boundaries(word_boundaries, maxCaptionSize=15, considerPunctuation=False):
+    """Caption timing from the TTS word boundaries, without running Whisper"""
+    return getCaptionsWithTime(wordBoundariesToAnalysis(word_boundaries), maxCaptionSize, considerPunctuation)
+
+def wordBoundariesToAnalysis(word_boundaries):
+    # Shape the boundaries like a whisper_timestamped result so the usual
+    # caption segmentation applies unchanged
+    words = [{'text': boundary['text'], 'start': boundary['start'], 'end': boundary['end']}
+             for boundary in word_boundaries]
+    text = ' ' + ' '.join(word['text'] for word in words)
+    return {'text': text, 'segments': [{'words': words}]}
+
+class WordBoundaryCaptioner:
+    """Captions timed from TTS word boundaries that arrive a chunk at a time.
+
+    Every caption but the last is settled once the words after it are
+    known, so add() times them as each chunk of the narration completes.
+    finish() closes the last one and returns the same captions
+    generate_timed_captions_from_word_boundaries gives for all the words.
+    """
+
+    def __init__(self, maxCaptionSize=15):
+        self.maxCaptionSize = maxCaptionSize
+        self.timed_captions = []
+        self._open = []
+        self._offsets = deque()
+        self._offset = 0
+        self._position = 0
+        self._start_time = 0
+
+    def add(self, word_boundaries):
+        """Add the boundaries of the next chunk, already on the joined timeline"""
+        words = list(self._open)
+        for boundary in word_boundaries:
+            # Same offsets as iterWordEndOffsets over wordBoundariesToAnalysis
+            self._offset += len(boundary['text']) + 1
+            self._offsets.append((self._offset, boundary['end']))
+            words.extend(iterWords(boundary['text']))
+        captions = list(iterWordsBySize(words, self.maxCaptionSize))
+        # The last caption may still take words from the next chunk
+        self._open = captions.pop().split() if captions else []
+        self._time(captions)
+
+    def finish(self):
+        if self._open:
+            self._time([' '.join(self._open)])
+            self._open = []
+        return self.timed_captions
+
+    def _time(self, captions):
+        for caption in captions:
+            caption = cleanWord(caption)
+            self._position += len(caption) + 1
+            while self._offsets and self._offsets[0][0] < self._position:
+                self._offsets.popleft()
+            end_time = self._offsets[0][1] if self._offsets else None
+            if end_time and caption:
+                self.timed_captions.append(((self._start_time, end_time), caption))
+                self._start_time = end_time
+
+def iterWordsBySize(words, maxCaptionSize):
+    """Group words into captions of at most maxCaptionSize characters.
+
+    A caption is closed once it reaches half the size, so captions stay
+    short enough to read. Words are consumed lazily in a single pass.
+    """
     halfCaptionSize = maxCaptionSize / 2
-    captions = []
-    while words:
-        caption = words[0]
-        words = words[1:]
-        while words and len(caption + ' ' + words[0]) <= maxCaptionSize:
-            caption += ' ' + words[0]
-            words = words[1:]
-            if len(caption) >= halfCaptionSize and words:
-                break
-        captions.append(caption)
-    return captions
+    caption = None
+    length = 0
+    for word in words:
+        if caption is None:
+            caption = [word]
+            length = len(word)
+        elif length + 1 + len(word) <= maxCaptionSize:
+            caption.append(word)
+            length += 1 + len(word)
+            if length >= halfCaptionSize:
+                yield ' '.join(caption)
+                caption = None
+        else:
+            yield ' '.join(caption)
+            caption = [word]
+            length = len(word)
+    if caption is not None:
+        yield ' '.join(caption)
+
+def splitWordsBySize(words, maxCaptionSize):
+
+    return list(iterWordsBySize(words, maxCaptionSize))
+
+def iterWords(text):
+    # Same tokens as text.split(), without building the list
+    for match in re.finditer(r'\S+', text):
+        yield match.group()
+
+def iterSentences(text):
+    # Same pieces as re.split(r'(?<=[.!?]) +', text), lazily
+    start = 0
+    for match in re.finditer(r'(?<=[.!?]) +', text):
+        yield text[start:match.start()]
+        start = match.end()
+    yield text[start:]
+
+def iterWordEndOffsets(whisper_analysis):
+    """Yield (character end offset, end time) for every transcribed word"""
+    index = 0
+    for segment in whisper_analysis['segments']:
+        for word in segment['words']:
+            index += len(word['text']) + 1
+            yield index, word['end']
 
 def getTimestampMapping(whisper_analysis):
    
@@ -35,6 +171,15 @@ def getTimestampMapping(whisper_analysis):
             index = newIndex
     return locationToTimestamp
 
+def getTimestampIndex(whisper_analysis):
+    """Sorted character end offsets and the matching word end times"""
+    offsets = []
+    times = []
+    for offset, end_time in iterWordEndOffsets(whisper_analysis):
+        offsets.append(offset)
+        times.append(end_time)
+    return offsets, times
+
 def cleanWord(word):
    
     return re.sub(r'[^\w\s\-_"\'\']', '', word)
@@ -46,26 +191,49 @@ def interpolateTimeFromDict(word_position, d):
             return value
     return None
 
-def getCaptionsWithTime(whisper_analysis, maxCaptionSize=15, considerPunctuation=False):
-   
-    wordLocationToTime = getTimestampMapping(whisper_analysis)
-    position = 0
-    start_time = 0
-    CaptionsPairs = []
+def interpolateTimeFromIndex(word_position, timestamp_index):
+    # Word ranges are contiguous, so the first range ending at or after the
+    # position is the one interpolateTimeFromDict would have matched
+    offsets, times = timestamp_index
+    i = bisect_left(offsets, word_position)
+    if i < len(offsets):
+        return times[i]
+    return None
+
+def interpolateTimesFromIndex(word_positions, timestamp_index):
+    """Batch version of interpolateTimeFromIndex for sorted positions"""
+    offsets, times = timestamp_index
+    result = []
+    i = 0
+    for word_position in word_positions:
+        i = bisect_left(offsets, word_position, i)
+        result.append(times[i] if i < len(offsets) else None)
+    return result
+
+def iterCaptionSegments(whisper_analysis, maxCaptionSize=15, considerPunctuation=False):
+    """Yield ((start, end), text) caption tuples in a single streaming pass"""
     text = whisper_analysis['text']
-    
     if considerPunctuation:
-        sentences = re.split(r'(?<=[.!?]) +', text)
-        words = [word for sentence in sentences for word in splitWordsBySize(sentence.split(), maxCaptionSize)]
+        captions = (caption for sentence in iterSentences(text)
+                    for caption in iterWordsBySize(iterWords(sentence), maxCaptionSize))
     else:
-        words = text.split()
-        words = [cleanWord(word) for word in splitWordsBySize(words, maxCaptionSize)]
-    
-    for word in words:
-        position += len(word) + 1
-        end_time = interpolateTimeFromDict(position, wordLocationToTime)
-        if end_time and word:
-            CaptionsPairs.append(((start_time, end_time), word))
+        captions = (cleanWord(caption) for caption in iterWordsBySize(iterWords(text), maxCaptionSize))
+
+    # Caption positions only grow, so the word offsets are walked once
+    # alongside them instead of being searched for every caption
+    wordOffsets = iterWordEndOffsets(whisper_analysis)
+    current = next(wordOffsets, None)
+    position = 0
+    start_time = 0
+    for caption in captions:
+        position += len(caption) + 1
+        while current is not None and current[0] < position:
+            current = next(wordOffsets, None)
+        end_time = current[1] if current is not None else None
+        if end_time and caption:
+            yield (start_time, end_time), caption
             start_time = end_time
 
-    return CaptionsPairs
+def getCaptionsWithTime(whisper_analysis, maxCaptionSize=15, considerPunctuation=False):
+
+    return list(iterCaptionSegments(whisper_analysis, maxCaptionSize, considerPunctuation))
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from utility.utils import sqlite_connection
+from utility.profiling import span
+
+# LLM_CACHE=on uses cached responses, refresh calls the model and overwrites
+# the cache, off bypasses it entirely
+LLM_CACHE_MODE = os.environ.get("LLM_CACHE", "on")
+LLM_CACHE_DB = os.environ.get("LLM_CACHE_DB", ".cache/llm_cache.sqlite")
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 5000))
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+class LLMCache:
+    """SQLite-backed store of raw LLM responses with TTL and LRU size eviction"""
+
+    def __init__(self, db_path=LLM_CACHE_DB, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "invalidated": 0, "stores": 0}
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, "
+                       "created REAL NOT NULL, last_used REAL NOT NULL)")
+
+    @staticmethod
+    def make_key(model, messages, params):
+        payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute("SELECT response, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                db.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+        self._count("hits" if row is not None else "misses")
+        return row[0] if row is not None else None
+
+    def set(self, key, model, response):
+        now = time.time()
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO llm_cache (key, model, response, created, last_used) "
+                       "VALUES (?, ?, ?, ?, ?)", (key, model, response, now, now))
+            db.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+            db.execute("DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache "
+                       "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+        self._count("stores")
+
+    def delete(self, key):
+        with self._connect() as db:
+            db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _connect(self):
+        return sqlite_connection(self.db_path)
+
+
+def get_llm_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+        return _default_cache
+
+
+def set_llm_cache_mode(mode):
+    """Switch the process-wide cache mode to on, off or refresh"""
+    global LLM_CACHE_MODE
+    if mode not in ("on", "off", "refresh"):
+        raise ValueError(f"Unknown LLM cache mode: {mode}")
+    LLM_CACHE_MODE = mode
+
+
+def get_llm_cache_mode():
+    return LLM_CACHE_MODE
+
+
+def cached_completion(create, model, messages, parse=None, mode=None, **params):
+    """Chat completion through the response cache.
+
+    create is the client's chat.completions.create. The raw response text is
+    cached under (model, messages, params), and parse runs on fresh and cached
+    responses alike: a cached entry that no longer parses is dropped and
+    fetched again, and a fresh response is only stored once it parsed.
+    Returns (parse(text), text, from_cache).
+    """
+    mode = mode or LLM_CACHE_MODE
+    parse = parse or (lambda text: text)
+    if mode == "off":
+        text = _complete(create, model, messages, params)
+        return parse(text), text, False
+
+    cache = get_llm_cache()
+    key = cache.make_key(model, messages, params)
+    if mode == "refresh":
+        cache._count("refreshes")
+    else:
+        text = cache.get(key)
+        if text is not None:
+            try:
+                return parse(text), text, True
+            except Exception as e:
+                print(f"Warning: Dropping cached LLM response that failed to parse: {e}")
+                cache.delete(key)
+                cache._count("invalidated")
+
+    text = _complete(create, model, messages, params)
+    result = parse(text)
+    cache.set(key, model, text)
+    return result, text, False
+
+
+def _complete(create, model, messages, params):
+    with span("llm_request", cat="llm", model=model):
+        response = create(model=model, messages=messages, **params)
+    return response.choices[0].message.content.strip()
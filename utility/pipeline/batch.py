@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from utility.profiling import span, use_tracer
+
+# Jobs allowed inside each stage at once. The I/O-bound stages (LLM, TTS,
+# Pexels, downloads) can run several jobs side by side while the CPU-bound
+# ones (Whisper, encoding) take one job at a time.
+DEFAULT_STAGE_LIMITS = {
+    "script": 4,
+    "prefetch": 4,
+    "tts": 4,
+    "captions": 1,
+    "search": 4,
+    "download": 4,
+    "normalize": 1,
+    "render": 1,
+}
+DEFAULT_JOBS_IN_FLIGHT = 6
+
+
+def slugify(text, max_length=40):
+    slug = re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+    return slug[:max_length].strip('-') or "video"
+
+
+def load_batch_jobs(path, output_dir="output", orientation="portrait"):
+    """Read jobs from a JSONL file of {"topic": ..., ...} objects or a plain list of topics.
+
+    Every job gets its own output directory under output_dir unless it names one.
+    """
+    jobs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                job = json.loads(line)
+                if not job.get("topic"):
+                    raise ValueError(f"Batch entry without a topic: {line}")
+            else:
+                job = {"topic": line}
+            job.setdefault("orientation", orientation)
+            job.setdefault("output_dir", os.path.join(output_dir, f"{len(jobs) + 1:04d}_{slugify(job['topic'])}"))
+            jobs.append(job)
+    return jobs
+
+
+def parse_stage_limits(value):
+    """Parse "script=4,render=2" into a dict of stage limits"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        name, _, limit = item.partition("=")
+        if name not in DEFAULT_STAGE_LIMITS:
+            raise ValueError(f"Unknown pipeline stage: {name}")
+        limits[name] = int(limit)
+    return limits
+
+
+def run_batch(jobs, stages, stage_limits=None, jobs_in_flight=DEFAULT_JOBS_IN_FLIGHT, finish=None):
+    """Run every job through the stages, overlapping jobs across stages.
+
+    stages is a list of (name, fn) where fn(job) updates the job dict in place.
+    Each stage admits at most stage_limits[name] jobs at a time, so while one
+    job is encoding, others can be waiting on the LLM, TTS or downloads. A
+    failing job is recorded and does not stop the rest. finish(job), if
+    given, runs when a job ends either way. Returns a summary report with per-job stage timings, throughput and failures.
+    """
+    limits = dict(DEFAULT_STAGE_LIMITS)
+    limits.update(stage_limits or {})
+    semaphores = {name: threading.BoundedSemaphore(limits.get(name, 1)) for name, _ in stages}
+
+    def run_job(job):
+        result = {"topic": job["topic"], "output_dir": job["output_dir"], "stages": {}}
+        job_start = time.perf_counter()
+        stage_name = None
+        try:
+            for stage_name, stage in stages:
+                with semaphores[stage_name], use_tracer(job.get("tracer")):
+                    stage_start = time.perf_counter()
+                    with span(stage_name, cat="stage"):
+                        stage(job)
+                    result["stages"][stage_name] = round(time.perf_counter() - stage_start, 3)
+            result["status"] = "succeeded"
+            result["output_video"] = job.get("output_video")
+            print(f"[batch] Finished: {job['topic']}")
+        except Exception as e:
+            result["status"] = "failed"
+            result["failed_stage"] = stage_name
+            result["error"] = str(e)
+            print(f"[batch] Failed at {stage_name}: {job['topic']}: {e}")
+            traceback.print_exc()
+        finally:
+            if finish is not None:
+                finish(job)
+        result["seconds"] = round(time.perf_counter() - job_start, 3)
+        return result
+
+    batch_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, jobs_in_flight)) as executor:
+        results = list(executor.map(run_job, jobs))
+    wall_time = time.perf_counter() - batch_start
+
+    return build_report(results, [name for name, _ in stages], limits, wall_time)
+
+
+def build_report(results, stage_names, limits, wall_time):
+    succeeded = [r for r in results if r["status"] == "succeeded"]
+    stage_totals = {}
+    for name in stage_names:
+        timings = [r["stages"][name] for r in results if name in r["stages"]]
+        stage_totals[name] = {
+            "limit": limits.get(name),
+            "jobs": len(timings),
+            "total_s": round(sum(timings), 3),
+            "mean_s": round(sum(timings) / len(timings), 3) if timings else None,
+        }
+    return {
+        "jobs": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "wall_time_s": round(wall_time, 3),
+        "videos_per_hour": round(len(succeeded) * 3600 / wall_time, 2) if wall_time else None,
+        "stages": stage_totals,
+        "failures": [{"topic": r["topic"], "stage": r["failed_stage"], "error": r["error"]}
+                     for r in results if r["status"] == "failed"],
+        "results": results,
+    }
+
+
+def print_report(report):
+    print(f"Batch: {report['succeeded']}/{report['jobs']} videos in {report['wall_time_s']:.1f}s "
+          f"({report['videos_per_hour']} videos/hour)")
+    for name, stats in report["stages"].items():
+        mean = f"{stats['mean_s']:.1f}s" if stats["mean_s"] is not None else "-"
+        print(f"  {name:<10} limit {stats['limit']}  jobs {stats['jobs']}  total {stats['total_s']:.1f}s  mean {mean}")
+    for failure in report["failures"]:
+        print(f"  FAILED [{failure['stage']}] {failure['topic']}: {failure['error']}")
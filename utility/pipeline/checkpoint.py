@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from utility.video.footage_cache import is_cache_entry
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_fingerprint(path):
+    """Cheap identity of a file's content: its size and modification time, or just its size for cache entries"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if is_cache_entry(path):
+        return [stat.st_size]
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def hash_inputs(name, inputs):
+    payload = json.dumps([MANIFEST_VERSION, name, inputs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Checkpoint:
+    """Manifest of completed stages in a job's output directory.
+
+    Each stage is recorded with a hash of its inputs, the job values it
+    produced and fingerprints of the files it wrote. A stage is skipped on a
+    rerun when its input hash matches and its files are still there
+    unchanged; its recorded outputs are put back on the job instead.
+    """
+
+    def __init__(self, output_dir, resume=True):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.stages = {}
+        self._lock = threading.Lock()
+        if resume and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    manifest = json.load(f)
+                if manifest.get("version") == MANIFEST_VERSION:
+                    self.stages = manifest.get("stages", {})
+            except (OSError, ValueError) as e:
+                print(f"Warning: Ignoring unreadable manifest {self.path}: {e}")
+
+    def restore(self, name, key, job):
+        """Put a stage's recorded outputs on job if they are still valid for key"""
+        entry = self.stages.get(name)
+        if entry is None or entry["key"] != key:
+            return False
+        if any(file_fingerprint(path) != fingerprint for path, fingerprint in entry["files"].items()):
+            return False
+        job.update(entry["outputs"])
+        return True
+
+    def restorable(self, names, job, specs):
+        """Whether the stages in names would all be skipped, restoring them in order on a copy of job"""
+        probe = dict(job)
+        return all(not rerun(specs[name], probe) and
+                   self.restore(name, hash_inputs(name, specs[name]["inputs"](probe)), probe) for name in names)
+
+    def record(self, name, key, outputs, files, seconds):
+        with self._lock:
+            self.stages[name] = {
+                "key": key,
+                "outputs": outputs,
+                "files": {path: file_fingerprint(path) for path in files},
+                "seconds": round(seconds, 3),
+                "completed": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            self._save()
+
+    def run(self, name, stage, job, spec):
+        """Run stage unless the manifest already has its result for the current inputs.
+
+        spec["inputs"](job) returns everything the stage output depends on,
+        spec["outputs"] names the job keys it sets and spec["files"](job), if
+        given, lists the files it writes. spec["rerun"](job), if given and
+        true, runs the stage even when its result is recorded. Returns True if
+        the stage ran.
+        """
+        key = hash_inputs(name, spec["inputs"](job))
+        if not rerun(spec, job) and self.restore(name, key, job):
+            print(f"Skipping {name}: inputs unchanged since the last run")
+            return False
+        start = time.perf_counter()
+        stage(job)
+        files = spec["files"](job) if "files" in spec else []
+        self.record(name, key, {output: job.get(output) for output in spec["outputs"]}, files,
+                    time.perf_counter() - start)
+        return True
+
+    def _save(self):
+        # Write a new file and swap it in, so a crash never leaves a torn manifest
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "stages": self.stages}, f, indent=2, default=str)
+        os.replace(temp_path, self.path)
+
+
+def rerun(spec, job):
+    return "rerun" in spec and spec["rerun"](job)
+
+
+def checkpointed(name, stage, spec):
+    """Wrap a pipeline stage to go through the job's checkpoint, if it has one"""
+    def run(job):
+        checkpoint = job.get("checkpoint")
+        if checkpoint is None:
+            stage(job)
+        else:
+            checkpoint.run(name, stage, job, spec)
+    return run
@@ -0,0 +1,166 @@
+import sys
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Windows has no getrusage; profiles there carry no memory or process CPU figures
+    resource = None
+
+# Tracer of the job running in the current thread or task. Unset means
+# tracing is off and span() costs almost nothing.
+_current_tracer = contextvars.ContextVar("tracer", default=None)
+
+
+class Tracer:
+    """Collects timed spans for one job as Chrome trace events.
+
+    Spans record wall time, the CPU time of the thread they ran on and the
+    process peak RSS when they ended. Spans from worker threads land on their
+    own track as long as the work was started in a copied context (see
+    run_in_context).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.events = []
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, cat, start, duration, cpu, args):
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": round((start - self.start) * 1e6, 1),
+            "dur": round(duration * 1e6, 1),
+            "tid": threading.get_ident(),
+            "args": dict(args, cpu_ms=round(cpu * 1000, 2)),
+        }
+        peak = peak_rss_mb()
+        if peak is not None:
+            event["args"]["peak_rss_mb"] = round(peak, 1)
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self):
+        """Count, total, mean and max wall time and total CPU time per span name"""
+        rows = {}
+        with self._lock:
+            events = list(self.events)
+        for event in events:
+            row = rows.setdefault(event["name"], {"cat": event["cat"], "count": 0, "total_s": 0.0, "max_s": 0.0,
+                                                  "cpu_s": 0.0})
+            seconds = event["dur"] / 1e6
+            row["count"] += 1
+            row["total_s"] += seconds
+            row["max_s"] = max(row["max_s"], seconds)
+            row["cpu_s"] += event["args"]["cpu_ms"] / 1000
+        for row in rows.values():
+            row["mean_s"] = row["total_s"] / row["count"]
+            for key in ("total_s", "max_s", "cpu_s", "mean_s"):
+                row[key] = round(row[key], 4)
+        return rows
+
+
+@contextmanager
+def use_tracer(tracer):
+    """Send spans in this context to tracer; None leaves tracing off"""
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
+
+
+def get_tracer():
+    return _current_tracer.get()
+
+
+@contextmanager
+def span(name, cat="pipeline", **args):
+    """Time the enclosed block into the current tracer, if any.
+
+    Yields the span's args dict so the block can add results to it.
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield args
+        return
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield args
+    finally:
+        tracer.add(name, cat, start, time.perf_counter() - start, time.thread_time() - cpu_start, args)
+
+
+def run_in_context(fn):
+    """Wrap fn to run in a copy of the caller's context, for thread pool workers"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where getrusage is missing"""
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def process_resources():
+    """Peak RSS and CPU time of this process and its children, empty where getrusage is missing"""
+    if resource is None:
+        return {}
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "cpu_user_s": round(own.ru_utime, 3),
+        "cpu_system_s": round(own.ru_stime, 3),
+        # ffmpeg and other subprocesses, once they have exited
+        "children_cpu_s": round(children.ru_utime + children.ru_stime, 3),
+    }
+
+
+def write_profile(path, tracers):
+    """Write the tracers as one Chrome trace (chrome://tracing, Perfetto), a job per process track.
+
+    The file also carries the per-job summaries and process resource usage.
+    """
+    trace_events = []
+    for pid, tracer in enumerate(tracers, 1):
+        trace_events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                             "args": {"name": tracer.name}})
+        # Line the jobs up on the same clock
+        shift = (tracer.start - tracers[0].start) * 1e6
+        trace_events.extend(dict(event, pid=pid, ts=round(event["ts"] + shift, 1)) for event in tracer.events)
+    profile = {
+        "traceEvents": trace_events,
+        "displayTimeUnit": "ms",
+        "resources": process_resources(),
+        "summaries": [{"job": tracer.name, "spans": tracer.summary()} for tracer in tracers],
+    }
+    with open(path, "w") as f:
+        json.dump(profile, f, indent=1)
+    return path
+
+
+def print_summary(tracer):
+    print(f"Profile: {tracer.name}")
+    print(f"  {'span':<22} {'count':>6} {'total':>9} {'mean':>9} {'max':>9} {'cpu':>9}")
+    rows = sorted(tracer.summary().items(), key=lambda item: (item[1]["cat"] != "stage", -item[1]["total_s"]))
+    for name, row in rows:
+        print(f"  {name:<22} {row['count']:>6} {row['total_s']:>8.2f}s {row['mean_s']:>8.3f}s "
+              f"{row['max_s']:>8.2f}s {row['cpu_s']:>8.2f}s")
+    resources = process_resources()
+    if not resources:
+        return
+    print(f"  peak RSS {resources['peak_rss_mb']:.0f} MB, CPU {resources['cpu_user_s'] + resources['cpu_system_s']:.1f}s "
+          f"(+{resources['children_cpu_s']:.1f}s in subprocesses)")
@@ -0,0 +1,285 @@
+import os
+import time
+import random
+import asyncio
+import inspect
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+
+# Per-provider limits: sustained requests per second, burst size and
+# requests in flight at once. Each can be overridden from the environment,
+# e.g. PEXELS_RATE_LIMIT=1 or LLM_MAX_IN_FLIGHT=2.
+PROVIDER_DEFAULTS = {
+    "llm": {"rate": 0.5, "burst": 4, "max_in_flight": 4},
+    "pexels": {"rate": 3.0, "burst": 10, "max_in_flight": 4},
+    "tts": {"rate": 5.0, "burst": 10, "max_in_flight": 4},
+}
+PROVIDER_RETRIES = 4
+PROVIDER_BACKOFF = 0.5
+PROVIDER_MAX_BACKOFF = 30.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+GROQ_MODEL = "llama-3.3-70b-versatile"
+
+_providers = {}
+_providers_lock = threading.Lock()
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Token bucket refilled at rate tokens per second, holding at most capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how long to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class Provider:
+    """Rate-limited, concurrency-capped access to one remote service.
+
+    Calls go through a token bucket and a cap on requests in flight, and
+    429/5xx responses or connection errors are retried with exponential
+    backoff, honoring Retry-After when the service sends one. HTTP requests
+    share a pooled session. Every entry point has a sync and an asyncio form.
+    """
+
+    def __init__(self, name, rate, burst, max_in_flight, retries=PROVIDER_RETRIES, backoff=PROVIDER_BACKOFF):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff
+        self.bucket = TokenBucket(rate, burst)
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "throttled_s": 0.0}
+        self._semaphore = threading.BoundedSemaphore(max_in_flight)
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.max_in_flight, pool_maxsize=self.max_in_flight)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    @contextmanager
+    def slot(self):
+        """Hold one in-flight slot, after waiting for a rate limit token"""
+        self._wait(self.bucket.reserve())
+        self._semaphore.acquire()
+        try:
+            self._count("calls")
+            yield
+        finally:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        delay = self.bucket.reserve()
+        if delay:
+            self._count("throttled_s", delay)
+            await asyncio.sleep(delay)
+        # Poll instead of blocking the event loop on the thread semaphore
+        poll = 0.005
+        while not self._semaphore.acquire(blocking=False):
+            await asyncio.sleep(poll)
+            poll = min(poll * 2, 0.1)
+        try:
+            self._count("calls")
+            yield
+        finally:
+            self._semaphore.release()
+
+    def call(self, fn, *args, **kwargs):
+        """Call fn under the limits, retrying retryable errors"""
+        for attempt in range(self.retries + 1):
+            try:
+                with self.slot():
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                self._wait(delay)
+
+    async def acall(self, fn, *args, **kwargs):
+        """Async form of call; fn may be a coroutine function or a blocking one"""
+        if not inspect.iscoroutinefunction(fn):
+            return await asyncio.to_thread(self.call, fn, *args, **kwargs)
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.async_slot():
+                    return await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                self._count("throttled_s", delay)
+                await asyncio.sleep(delay)
+
+    def request(self, method, url, **kwargs):
+        """HTTP request on the pooled session, retrying 429/5xx responses.
+
+        Returns the last response when the retries run out, like requests does.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                with self.slot():
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                self._wait(delay)
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                if response.status_code in RETRY_STATUSES:
+                    self._count("failures")
+                return response
+            delay = self._backoff(attempt, response.headers.get("Retry-After"))
+            self._count("retries")
+            response.close()
+            self._wait(delay)
+
+    async def arequest(self, method, url, **kwargs):
+        return await asyncio.to_thread(self.request, method, url, **kwargs)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["throttled_s"] = round(stats["throttled_s"], 3)
+        return stats
+
+    def _retry_delay(self, error, attempt):
+        """Seconds to wait before retrying error, or None if it should be raised"""
+        if attempt >= self.retries or not is_retryable(error):
+            if is_retryable(error):
+                self._count("failures")
+            return None
+        self._count("retries")
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+        return self._backoff(attempt, headers.get("Retry-After"))
+
+    def _backoff(self, attempt, retry_after=None):
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            delay = self.backoff * 2 ** attempt * random.uniform(0.8, 1.2)
+        return min(delay, PROVIDER_MAX_BACKOFF)
+
+    def _wait(self, delay):
+        if delay > 0:
+            self._count("throttled_s", delay)
+            time.sleep(delay)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+
+def get_status_code(error):
+    """HTTP status carried by an exception from requests, openai/groq or aiohttp"""
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error):
+    status = get_status_code(error)
+    if status is not None:
+        return status in RETRY_STATUSES
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        return True
+    # openai and groq raise APIConnectionError / APITimeoutError without a status
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def parse_retry_after(value):
+    """Retry-After header as seconds, from either delta-seconds or an HTTP date"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_provider(name):
+    """Process-wide provider by name, created from PROVIDER_DEFAULTS and the environment"""
+    with _providers_lock:
+        if name not in _providers:
+            limits = dict(PROVIDER_DEFAULTS.get(name, {"rate": 5.0, "burst": 10, "max_in_flight": 4}))
+            prefix = name.upper()
+            limits["rate"] = float(os.environ.get(f"{prefix}_RATE_LIMIT", limits["rate"]))
+            limits["burst"] = int(os.environ.get(f"{prefix}_BURST", limits["burst"]))
+            limits["max_in_flight"] = int(os.environ.get(f"{prefix}_MAX_IN_FLIGHT", limits["max_in_flight"]))
+            _providers[name] = Provider(name, **limits)
+        return _providers[name]
+
+
+def configure_provider(name, **limits):
+    """Replace a provider with one using the given limits (rate, burst, max_in_flight, retries, backoff)"""
+    with _providers_lock:
+        _providers.pop(name, None)
+    defaults = get_provider(name)
+    settings = {"rate": defaults.bucket.rate, "burst": defaults.bucket.capacity,
+                "max_in_flight": defaults.max_in_flight, "retries": defaults.retries, "backoff": defaults.backoff}
+    settings.update(limits)
+    provider = Provider(name, **settings)
+    with _providers_lock:
+        _providers[name] = provider
+    return provider
+
+
+def use_groq():
+    return len(os.environ.get("GROQ_API_KEY") or "") > 30
+
+
+def get_llm_client():
+    """Shared Groq or OpenAI client, created on first use.
+
+    The SDK's own retries are turned off since the llm provider retries.
+    OPENAI_BASE_URL / GROQ_BASE_URL point the client at another endpoint,
+    such as the stub server in benchmarks/stubs.py.
+    """
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            if use_groq():
+                from groq import Groq
+                _llm_client = Groq(api_key=os.environ["GROQ_API_KEY"], max_retries=0)
+            else:
+                from openai import OpenAI
+                _llm_client = OpenAI(api_key=os.environ.get("OPENAI_KEY"), max_retries=0)
+        return _llm_client
+
+
+def chat_completion(**kwargs):
+    """client.chat.completions.create through the llm provider's limits and retries"""
+    return get_provider("llm").call(get_llm_client().chat.completions.create, **kwargs)
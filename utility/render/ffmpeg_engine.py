@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import subprocess
+from utility.profiling import span
+from utility.audio.pcm import audio_duration, ffmpeg_audio_input
+from utility.render.text_renderer import render_text_image, CAPTION_STYLE, CAPTION_Y
+
+FPS = 25
+PRESET = "veryfast"
+AUDIO_SAMPLE_RATE = 44100
+
+
+def get_ffmpeg_binary():
+    """ffmpeg executable, preferring the one MoviePy is configured with"""
+    ffmpeg_binary = os.environ.get("FFMPEG_BINARY")
+    if ffmpeg_binary and ffmpeg_binary != "ffmpeg-imageio":
+        return ffmpeg_binary
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return shutil.which("ffmpeg") or "ffmpeg"
+
+
+def probe_media(filename):
+    """Container info (duration, video_size, ...) from ffmpeg's header parse, no decoding"""
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+    return ffmpeg_parse_infos(filename)
+
+
+def build_filtergraph(background_clips, caption_images, fps=FPS, caption_y=CAPTION_Y):
+    """Compile the timeline into a filtergraph string.
+
+    Mirrors CompositeVideoClip: a black canvas the size of the first clip, each
+    background clip laid at the top-left corner for [t1, t2) and holding its
+    last frame if it runs short, then captions centred horizontally at
+    caption_y. background_clips holds (t1, t2, offset) with offset the point in
+    the source clip shown at t1. Input 0 is the canvas, which sets the output
+    size and duration, then one input per background clip and one per caption
+    image, in that order. The result is labelled [vout].
+    """
+    filters = ["[0:v]setsar=1[base0]"]
+    current = "base0"
+    input_index = 1
+    for n, (t1, t2, offset) in enumerate(background_clips):
+        length = t2 - t1
+        seek = f"trim=start={offset:.3f},setpts=PTS-STARTPTS," if offset > 0 else ""
+        filters.append(
+            f"[{input_index}:v]{seek}fps={fps},setsar=1,tpad=stop_mode=clone:stop_duration={length:.3f},"
+            f"trim=duration={length:.3f},setpts=PTS-STARTPTS+{t1:.3f}/TB[bg{n}]"
+        )
+        filters.append(
+            f"[{current}][bg{n}]overlay=x=0:y=0:eof_action=pass:"
+            f"enable='gte(t,{t1:.3f})*lt(t,{t2:.3f})'[vbg{n}]"
+        )
+        current = f"vbg{n}"
+        input_index += 1
+
+    for n, (t1, t2) in enumerate(caption_images):
+        filters.append(
+            f"[{current}][{input_index}:v]overlay=x=(main_w-overlay_w)/2:y={caption_y}:"
+            f"enable='gte(t,{t1:.3f})*lt(t,{t2:.3f})'[vcap{n}]"
+        )
+        current = f"vcap{n}"
+        input_index += 1
+
+    filters.append(f"[{current}]format=yuv420p[vout]")
+    return ";\n".join(filters)
+
+
+def render_with_ffmpeg(audio_file_path, timed_captions, background_video_files, output_path,
+                       fps=FPS, preset=PRESET, caption_style=None, audio=True, duration=None, size=None,
+                       frames=None):
+    """Render the timeline with a single ffmpeg invocation.
+
+    background_video_files is a list of ((t1, t2), local_path[, offset]) and
+    timed_captions a list of ((t1, t2), text), as for get_output_media. Caption
+    images come from the same Pillow rasterizer as the MoviePy path; frames
+    never pass through Python. duration and size default to the narration
+    length and the first clip's size; frames caps the exact frame count.
+    """
+    if not background_video_files and size is None:
+        raise ValueError("No background videos to render")
+    caption_style = caption_style or CAPTION_STYLE
+    if duration is None:
+        duration = audio_duration(audio_file_path)
+    if size is None:
+        size = tuple(probe_media(background_video_files[0][1])['video_size'])
+
+    work_dir = tempfile.mkdtemp(prefix="ffmpeg_render_")
+    try:
+        cmd = [get_ffmpeg_binary(), '-y', '-hide_banner', '-loglevel', 'error',
+               '-f', 'lavfi', '-i', f"color=c=black:s={size[0]}x{size[1]}:r={fps}:d={duration:.3f}"]
+
+        background_clips = []
+        for entry in background_video_files:
+            (t1, t2), filename = entry[:2]
+            offset = entry[2] if len(entry) > 2 else 0
+            cmd += ['-i', filename]
+            background_clips.append((t1, t2, offset))
+
+        caption_images = []
+        for n, ((t1, t2), text) in enumerate(timed_captions):
+            if not text:
+                continue
+            image_path = os.path.join(work_dir, f"caption_{n}.png")
+            with span("caption", cat="render"):
+                from PIL import Image
+                Image.fromarray(render_text_image(text, **caption_style)).save(image_path)
+            cmd += ['-i', image_path]
+            caption_images.append((t1, t2))
+
+        if audio:
+            cmd += ffmpeg_audio_input(audio_file_path)
+
+        # Long timelines overflow the command line, so the graph goes in a file
+        filtergraph_path = os.path.join(work_dir, "filtergraph.txt")
+        with open(filtergraph_path, "w") as f:
+            f.write(build_filtergraph(background_clips, caption_images, fps=fps))
+        cmd += ['-filter_complex_script', filtergraph_path, '-map', '[vout]']
+
+        if audio:
+            audio_input = 1 + len(background_clips) + len(caption_images)
+            cmd += ['-map', f'{audio_input}:a', '-c:a', 'aac', '-ar', str(AUDIO_SAMPLE_RATE)]
+        else:
+            cmd += ['-an']
+
+        cmd += ['-c:v', 'libx264', '-preset', preset, '-r', str(fps)]
+        if frames is not None:
+            cmd += ['-frames:v', str(frames)]
+        else:
+            cmd += ['-t', f"{duration:.3f}"]
+        cmd.append(output_path)
+
+        print(f"Writing video with ffmpeg to: {output_path}")
+        with span("encode", cat="render", renderer="ffmpeg"):
+            subprocess.run(cmd, check=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return output_path
@@ -0,0 +1,78 @@
+from bisect import bisect_right
+
+
+class LazyBackground:
+    """Background footage for a timeline, decoding one clip at a time.
+
+    clips is a list of (t1, t2, path, offset). A clip's reader is opened when
+    the timeline first asks for a frame inside [t1, t2) and closed as soon as
+    a frame outside it is requested, so at most one ffmpeg reader and its
+    frame buffer are alive however many segments the video has. Each clip is
+    played from offset for the length of its segment, holding its last frame
+    if it is shorter, and frames are placed at the top left of a size canvas
+    like CompositeVideoClip does. Segments are expected in timeline order;
+    where two overlap, the one starting later wins. Gaps are black.
+    """
+
+    def __init__(self, clips, size):
+        self.clips = sorted(clips, key=lambda clip: clip[0])
+        self.starts = [clip[0] for clip in self.clips]
+        self.size = tuple(size)
+        self.opened = 0
+        self._index = None
+        self._reader = None
+        self._black = None
+
+    def segment_at(self, t):
+        i = bisect_right(self.starts, t) - 1
+        while i >= 0:
+            if self.clips[i][1] > t:
+                return i
+            i -= 1
+        return None
+
+    def make_frame(self, t):
+        import numpy as np
+        index = self.segment_at(t)
+        if index != self._index:
+            self.close()
+            if index is not None:
+                from moviepy.editor import VideoFileClip
+                self._reader = VideoFileClip(self.clips[index][2], audio=False)
+                self._index = index
+                self.opened += 1
+        if self._reader is None:
+            if self._black is None:
+                self._black = np.zeros((self.size[1], self.size[0], 3), dtype=np.uint8)
+            return self._black
+
+        t1, _, _, offset = self.clips[index]
+        reader = self._reader
+        local_t = min(offset + t - t1, max(0.0, reader.duration - 1.0 / reader.fps))
+        frame = reader.get_frame(local_t)
+        height, width = frame.shape[:2]
+        if (width, height) == self.size:
+            return frame
+        canvas = np.zeros((self.size[1], self.size[0], 3), dtype=np.uint8)
+        height, width = min(height, self.size[1]), min(width, self.size[0])
+        canvas[:height, :width] = frame[:height, :width, :3]
+        return canvas
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+        self._reader = None
+        self._index = None
+
+
+def make_lazy_background_clip(clips, size, duration):
+    """A MoviePy clip of duration seconds playing clips through a LazyBackground.
+
+    Returns (clip, background); close the background once rendering is done.
+    """
+    from moviepy.editor import VideoClip
+    background = LazyBackground(clips, size)
+    clip = VideoClip(background.make_frame, duration=duration)
+    # VideoClip read a frame to find its size; don't keep that reader open
+    background.close()
+    return clip, background
@@ -0,0 +1,94 @@
+import os
+import hashlib
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from utility.video.footage_cache import FootageCache, is_cache_entry
+from utility.render.ffmpeg_engine import get_ffmpeg_binary, FPS
+from utility.profiling import span, run_in_context
+
+NORMALIZED_CACHE_DIR = os.environ.get("NORMALIZED_CACHE_DIR", ".cache/normalized")
+NORMALIZED_CACHE_MAX_BYTES = int(os.environ.get("NORMALIZED_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# ffmpeg already uses several threads per transcode
+NORMALIZE_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+NORMALIZE_PRESET = "veryfast"
+NORMALIZE_CRF = 18
+
+_normalized_cache = None
+
+
+def get_target_size(orientation_landscape):
+    return (1920, 1080) if orientation_landscape else (1080, 1920)
+
+
+def normalized_key(path, duration, size, fps, offset):
+    stat = os.stat(path)
+    if is_cache_entry(path):
+        # Footage cache hits refresh the mtime, the hashed name and size already pin the content
+        source = f"{os.path.basename(path)}|{stat.st_size}"
+    else:
+        source = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    key = f"{source}|{size[0]}x{size[1]}|{fps}|{offset:.3f}|{duration:.3f}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def normalize_clip(path, output_path, duration, size, fps=FPS, offset=0.0, preset=NORMALIZE_PRESET):
+    """Transcode the [offset, offset + duration] part of a clip to size, fps and yuv420p, without audio.
+
+    The clip is scaled to cover size and center-cropped, so every
+    normalized clip fills the frame whatever its source aspect ratio.
+    """
+    width, height = size
+    cmd = [get_ffmpeg_binary(), '-y', '-loglevel', 'error']
+    if offset:
+        cmd += ['-ss', f"{offset:.3f}"]
+    cmd += ['-i', path, '-t', f"{duration:.3f}",
+            '-vf', f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},"
+                   f"setsar=1,fps={fps},format=yuv420p",
+            '-an', '-c:v', 'libx264', '-preset', preset, '-crf', str(NORMALIZE_CRF),
+            '-f', 'mp4', output_path]
+    subprocess.run(cmd, check=True)
+    return output_path
+
+
+def get_normalized_cache():
+    global _normalized_cache
+    if _normalized_cache is None:
+        _normalized_cache = FootageCache(NORMALIZED_CACHE_DIR, NORMALIZED_CACHE_MAX_BYTES)
+    return _normalized_cache
+
+
+def normalize_background_videos(background_video_files, size, fps=FPS, max_workers=NORMALIZE_WORKERS,
+                                use_cache=True, temp_files=None):
+    """Turn [[(t1, t2), path], ...] into clips of uniform size and fps trimmed to their segments.
+
+    Clips are transcoded concurrently. With the cache, a clip already
+    normalized for the same source, segment length and format is reused;
+    without it, outputs go to temporary files appended to temp_files.
+    """
+    cache = get_normalized_cache() if use_cache else None
+
+    def normalize(entry):
+        (t1, t2), path = entry
+        # One frame of slack so the segment never runs out before t2
+        duration = t2 - t1 + 1.0 / fps
+        with span("normalize_clip", cat="normalize", source=os.path.basename(path)) as info:
+            if cache is not None:
+                key = normalized_key(path, duration, size, fps, 0.0)
+                info["cached"] = cache.contains(key)
+                output_path = cache.fetch(key, lambda _, temp_path: normalize_clip(path, temp_path, duration,
+                                                                                    size, fps))
+            else:
+                output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4').name
+                if temp_files is not None:
+                    temp_files.append(output_path)
+                normalize_clip(path, output_path, duration, size, fps)
+        return [[t1, t2], output_path]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        normalized = list(executor.map(run_in_context(normalize), background_video_files))
+
+    if cache is not None:
+        stats = cache.get_stats()
+        print(f"Normalized clip cache: {stats['hits']} hits, {stats['misses']} misses")
+    return normalized
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from utility.audio.pcm import audio_duration, ffmpeg_audio_input
+from utility.render.ffmpeg_engine import (get_ffmpeg_binary, probe_media, render_with_ffmpeg, FPS, PRESET,
+                                          AUDIO_SAMPLE_RATE)
+from utility.render.text_renderer import CAPTION_STYLE, CAPTION_Y
+
+RENDER_WORKERS = os.cpu_count() or 1
+
+
+def snap_to_frame(t, fps=FPS):
+    return round(t * fps) / fps
+
+
+def split_timeline(duration, background_video_files, timed_captions, fps=FPS):
+    """Cut the timeline at background clip boundaries into independent chunks.
+
+    Boundaries are snapped to the frame grid so the chunks add up to exactly the
+    frames of the whole video. Each chunk has its own local times: backgrounds
+    as ((t1, t2), path, offset) and the captions overlapping it as ((t1, t2), text).
+    """
+    end = snap_to_frame(duration, fps)
+    boundaries = {0.0, end}
+    for (t1, t2), _ in background_video_files:
+        for t in (t1, t2):
+            t = snap_to_frame(t, fps)
+            if 0 < t < end:
+                boundaries.add(t)
+    boundaries = sorted(boundaries)
+
+    chunks = []
+    for start, stop in zip(boundaries, boundaries[1:]):
+        backgrounds = []
+        for (t1, t2), path in background_video_files:
+            if t1 < stop and t2 > start:
+                backgrounds.append(((max(t1, start) - start, min(t2, stop) - start), path, max(0.0, start - t1)))
+        captions = []
+        for (t1, t2), text in timed_captions:
+            if t1 < stop and t2 > start:
+                captions.append(((max(t1, start) - start, min(t2, stop) - start), text))
+        chunks.append({
+            "start": start,
+            "frames": int(round((stop - start) * fps)),
+            "backgrounds": backgrounds,
+            "captions": captions,
+        })
+    return chunks
+
+
+def render_chunk(chunk, output_path, size, renderer="moviepy", caption_renderer="pillow", fps=FPS, preset=PRESET):
+    """Encode one chunk, video only, to exactly chunk["frames"] frames"""
+    frames = chunk["frames"]
+    if renderer == "ffmpeg" or not chunk["backgrounds"]:
+        # Gaps with no footage are just the black canvas and captions
+        return render_with_ffmpeg(None, chunk["captions"], chunk["backgrounds"], output_path, fps=fps,
+                                  preset=preset, audio=False, duration=frames / fps, size=size, frames=frames)
+
+    from moviepy.editor import CompositeVideoClip
+    from utility.render.render_engine import create_text_clip
+    from utility.render.lazy_timeline import make_lazy_background_clip
+
+    background_clip, lazy_background = make_lazy_background_clip(
+        [(t1, t2, path, offset) for (t1, t2), path, offset in chunk["backgrounds"]], size, frames / fps)
+    visual_clips = [background_clip]
+    for (t1, t2), text in chunk["captions"]:
+        text_clip = create_text_clip(text=text, renderer=caption_renderer, **CAPTION_STYLE)
+        visual_clips.append(text_clip.set_start(t1).set_end(t2).set_position(("center", CAPTION_Y)))
+
+    # MoviePy writes every frame t in arange(0, duration, 1/fps); stop just short
+    # of the next frame so the count is exactly `frames`
+    video = CompositeVideoClip(visual_clips, size=size).set_duration(frames / fps - 1e-6)
+    video.write_videofile(output_path, codec='libx264', fps=fps, preset=preset, audio=False, logger=None)
+    lazy_background.close()
+    for clip in visual_clips:
+        clip.close()
+    return output_path
+
+
+def render_parallel(audio_file_path, timed_captions, background_video_files, output_path, workers=RENDER_WORKERS,
+                    renderer="moviepy", caption_renderer="pillow", fps=FPS, preset=PRESET):
+    """Render the timeline as independent chunks across a process pool.
+
+    Chunks are encoded without audio as MP4, joined with a stream-copy
+    concat and muxed with the narration once, so there is no re-encode at
+    the seams and audio timing comes from a single continuous track.
+    """
+    if not background_video_files:
+        raise ValueError("No background videos to render")
+    duration = audio_duration(audio_file_path)
+    # The canvas is the first clip's size, as with CompositeVideoClip
+    size = tuple(probe_media(background_video_files[0][1])['video_size'])
+    chunks = split_timeline(duration, background_video_files, timed_captions, fps)
+
+    work_dir = tempfile.mkdtemp(prefix="parallel_render_")
+    try:
+        chunk_paths = [os.path.join(work_dir, f"chunk_{n:04d}.mp4") for n in range(len(chunks))]
+        print(f"Rendering {len(chunks)} chunks with {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(render_chunk, chunk, path, size, renderer, caption_renderer, fps, preset)
+                       for chunk, path in zip(chunks, chunk_paths)]
+            for future in futures:
+                future.result()
+
+        concat_list = os.path.join(work_dir, "chunks.txt")
+        with open(concat_list, "w") as f:
+            for path in chunk_paths:
+                f.write(f"file '{path}'\n")
+
+        total_frames = sum(chunk["frames"] for chunk in chunks)
+        print(f"Writing video to: {output_path}")
+        subprocess.run([get_ffmpeg_binary(), '-y', '-hide_banner', '-loglevel', 'error',
+                        '-f', 'concat', '-safe', '0', '-i', concat_list, *ffmpeg_audio_input(audio_file_path),
+                        '-map', '0:v', '-map', '1:a', '-c:v', 'copy', '-c:a', 'aac', '-ar', str(AUDIO_SAMPLE_RATE),
+                        '-t', f"{total_frames / fps:.3f}", '-movflags', '+faststart', output_path], check=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return output_path
@@ -4,12 +4,26 @@ import tempfile
 import zipfile
 import platform
 import subprocess
-from moviepy.editor import (AudioFileClip, CompositeVideoClip, CompositeAudioClip, ImageClip,
-                            TextClip, VideoFileClip)
-from moviepy.audio.fx.audio_loop import audio_loop
-from moviepy.audio.fx.audio_normalize import audio_normalize
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
+from utility.video.footage_cache import get_footage_cache
+from utility.render.text_renderer import render_text_image, CAPTION_STYLE, CAPTION_Y
+from utility.profiling import span, run_in_context
+
+DOWNLOAD_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = (10, 60)  # (connect, read) seconds
+
+_download_session = None
+_download_session_lock = threading.Lock()
 
 def get_imagemagick_version():
     try:
@@ -21,8 +35,19 @@ def get_imagemagick_version():
     except:
         return None
 
-def create_text_clip(text, fontsize=100, color="white", stroke_width=3, stroke_color="black", method="label"):
+def create_text_clip(text, fontsize=100, color="white", stroke_width=3, stroke_color="black", method="label",
+                     font="Arial", renderer="pillow"):
+    """Create a text clip, rendered in-process with Pillow unless renderer="magick" is requested"""
+    from moviepy.editor import ImageClip
+    if renderer == "magick":
+        return create_magick_text_clip(text, fontsize, color, stroke_width, stroke_color, method, font)
+    # The RGBA frame's alpha channel becomes the clip mask
+    return ImageClip(render_text_image(text, font, fontsize, color, stroke_width, stroke_color))
+
+def create_magick_text_clip(text, fontsize=100, color="white", stroke_width=3, stroke_color="black", method="label",
+                            font="Arial"):
     """Create a text clip using direct ImageMagick commands for version 7.x"""
+    from moviepy.editor import ImageClip
     try:
         # Create a temporary file for the text image
         temp_img = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
@@ -33,7 +58,7 @@ def create_text_clip(text, fontsize=100, color="white", stroke_width=3, stroke_c
             'magick',
             '-background', 'transparent',
             '-fill', color,
-            '-font', 'Arial',
+            '-font', font,
             '-pointsize', str(fontsize),
             '-stroke', stroke_color,
             '-strokewidth', str(stroke_width),
@@ -59,13 +84,78 @@ def create_text_clip(text, fontsize=100, color="white", stroke_width=3, stroke_c
         print(f"Error creating text clip: {str(e)}")
         raise
 
-def download_file(url, filename):
-    with open(filename, 'wb') as f:
-        headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers)
-        f.write(response.content)
+def get_download_session():
+    """Shared HTTP session with a connection pool sized for the download workers"""
+    global _download_session
+    with _download_session_lock:
+        if _download_session is None:
+            session = requests.Session()
+            session.headers.update(DOWNLOAD_HEADERS)
+            retry = Retry(total=DOWNLOAD_RETRIES, backoff_factor=0.5,
+                          status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+            adapter = HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS,
+                                  max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _download_session = session
+        return _download_session
+
+def download_file(url, filename, session=None, retries=DOWNLOAD_RETRIES):
+    """Stream url to filename in chunks, retrying truncated or failed transfers"""
+    session = session or get_download_session()
+    for attempt in range(retries + 1):
+        try:
+            with session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                expected_size = int(response.headers.get("Content-Length") or 0)
+                if response.headers.get("Content-Encoding"):
+                    expected_size = 0  # Length is of the encoded body, not what we write
+                written = 0
+                with open(filename, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        written += len(chunk)
+            if expected_size and written != expected_size:
+                raise IOError(f"Incomplete download of {url}: got {written} of {expected_size} bytes")
+            return filename
+        except (requests.HTTPError, requests.exceptions.RetryError):
+            raise  # Status retries are already handled by the session adapter
+        except (requests.RequestException, IOError) as e:
+            if attempt == retries:
+                raise
+            print(f"Warning: Download failed ({e}), retrying {url}")
+            time.sleep(0.5 * 2 ** attempt)
+
+def fetch_background_videos(video_urls, temp_files, max_workers=DOWNLOAD_WORKERS, use_cache=True):
+    """Resolve clip URLs to local files concurrently, in order.
+
+    With the footage cache enabled, cached clips are returned without touching
+    the network and new downloads are kept for later renders. Otherwise clips
+    go to temporary files that are appended to temp_files for cleanup.
+    """
+    if not video_urls:
+        return []
+    session = get_download_session()
+    cache = get_footage_cache() if use_cache else None
+
+    def fetch(url):
+        if os.path.isfile(url):
+            return url  # Already a local clip
+        with span("clip_download", cat="download", url=url) as info:
+            if cache is not None:
+                info["cached"] = cache.contains(url)
+                return cache.fetch(url, lambda link, filename: download_file(link, filename, session))
+            filename = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4').name
+            temp_files.append(filename)
+            return download_file(url, filename, session)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        video_files = list(executor.map(run_in_context(fetch), video_urls))
+
+    if cache is not None:
+        stats = cache.get_stats()
+        print(f"Footage cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions")
+    return video_files
 
 def search_program(program_name):
     try: 
@@ -89,7 +179,9 @@ def get_program_path(program_name):
     
     return search_program(program_name)
 
-def get_output_media(audio_file_path, timed_captions, background_video_data, video_server, output_path=None):
+def get_output_media(audio_file_path, timed_captions, background_video_data, video_server, output_path=None,
+                     download_workers=DOWNLOAD_WORKERS, use_footage_cache=True, caption_renderer="pillow",
+                     renderer="moviepy", render_workers=1, lazy_clips=True):
     # Use provided output path or default
     OUTPUT_FILE_NAME = output_path if output_path else "rendered_video.mp4"
     
@@ -99,52 +191,80 @@ def get_output_media(audio_file_path, timed_captions, background_video_data, vid
         os.makedirs(output_dir)
 
     # Set ImageMagick path based on platform and version
-    if platform.system() == "Windows":
-        magick_path = search_program("magick")
-        if not magick_path:
-            magick_path = r"C:\Program Files\ImageMagick-7.1.1-Q16-HDRI\magick.exe"
-    else:
-        magick_path = get_program_path("magick") or '/usr/bin/convert'
-    
-    print(f"ImageMagick path: {magick_path}")
-    if os.path.exists(magick_path):
-        os.environ['IMAGEMAGICK_BINARY'] = magick_path
-    else:
-        print(f"Warning: ImageMagick not found at {magick_path}")
+    if caption_renderer == "magick":
+        if platform.system() == "Windows":
+            magick_path = search_program("magick")
+            if not magick_path:
+                magick_path = r"C:\Program Files\ImageMagick-7.1.1-Q16-HDRI\magick.exe"
+        else:
+            magick_path = get_program_path("magick") or '/usr/bin/convert'
+
+        print(f"ImageMagick path: {magick_path}")
+        if os.path.exists(magick_path):
+            os.environ['IMAGEMAGICK_BINARY'] = magick_path
+        else:
+            print(f"Warning: ImageMagick not found at {magick_path}")
     
     temp_files = []  # Keep track of temporary files for cleanup
     visual_clips = []
+    audio_clips = []
+    lazy_background = None
     
     try:
-        for (t1, t2), video_url in background_video_data:
-            # Download the video file
-            video_filename = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4').name
-            temp_files.append(video_filename)  # Add to cleanup list
-            download_file(video_url, video_filename)
-            
-            # Create VideoFileClip from the downloaded file
-            video_clip = VideoFileClip(video_filename)
-            video_clip = video_clip.set_start(t1)
-            video_clip = video_clip.set_end(t2)
-            visual_clips.append(video_clip)
+        # Fetch all the video files concurrently, reusing cached footage
+        video_files = fetch_background_videos([video_url for _, video_url in background_video_data], temp_files,
+                                              max_workers=download_workers, use_cache=use_footage_cache)
+
+        background_video_files = [[interval, video_filename] for (interval, _), video_filename
+                                  in zip(background_video_data, video_files)]
+        if render_workers > 1:
+            # Encode chunks split at clip boundaries in separate processes, then stream-copy concat
+            from utility.render.parallel_render import render_parallel
+            render_parallel(audio_file_path, timed_captions, background_video_files, OUTPUT_FILE_NAME,
+                            workers=render_workers, renderer=renderer, caption_renderer=caption_renderer)
+            return OUTPUT_FILE_NAME
+
+        if renderer == "ffmpeg":
+            # Compile the whole timeline into one ffmpeg filtergraph instead of compositing in Python
+            from utility.render.ffmpeg_engine import render_with_ffmpeg
+            render_with_ffmpeg(audio_file_path, timed_captions, background_video_files, OUTPUT_FILE_NAME)
+            return OUTPUT_FILE_NAME
+
+        from moviepy.editor import CompositeVideoClip, CompositeAudioClip, VideoFileClip
+        from utility.audio.pcm import audio_clip
+
+        if lazy_clips and background_video_files:
+            # One clip that opens each file's reader only while the timeline is inside its segment
+            from utility.render.ffmpeg_engine import probe_media
+            from utility.render.lazy_timeline import make_lazy_background_clip
+            size = probe_media(video_files[0])['video_size']
+            background_clip, lazy_background = make_lazy_background_clip(
+                [(t1, t2, video_filename, 0) for (t1, t2), video_filename in background_video_files],
+                size, max(t2 for (_, t2), _ in background_video_files))
+            visual_clips.append(background_clip)
+        else:
+            for ((t1, t2), video_url), video_filename in zip(background_video_data, video_files):
+                # Create VideoFileClip from the downloaded file
+                video_clip = VideoFileClip(video_filename)
+                video_clip = video_clip.set_start(t1)
+                video_clip = video_clip.set_end(t2)
+                visual_clips.append(video_clip)
         
-        audio_clips = []
-        audio_file_clip = AudioFileClip(audio_file_path)
-        audio_clips.append(audio_file_clip)
+        # The narration's decoded samples, memory-mapped rather than decoded again
+        audio_clips.append(audio_clip(audio_file_path))
 
         # Use our custom text clip creation for ImageMagick 7.x
         for (t1, t2), text in timed_captions:
             try:
-                text_clip = create_text_clip(
-                    text=text,
-                    fontsize=100,
-                    color="white",
-                    stroke_width=3,
-                    stroke_color="black"
-                )
+                with span("caption", cat="render"):
+                    text_clip = create_text_clip(
+                        text=text,
+                        renderer=caption_renderer,
+                        **CAPTION_STYLE
+                    )
                 text_clip = text_clip.set_start(t1)
                 text_clip = text_clip.set_end(t2)
-                text_clip = text_clip.set_position(("center", 800))
+                text_clip = text_clip.set_position(("center", CAPTION_Y))
                 visual_clips.append(text_clip)
             except Exception as e:
                 print(f"Warning: Failed to create text clip: {str(e)}")
@@ -158,9 +278,15 @@ def get_output_media(audio_file_path, timed_captions, background_video_data, vid
             video.audio = audio
 
         print(f"Writing video to: {OUTPUT_FILE_NAME}")
-        video.write_videofile(OUTPUT_FILE_NAME, codec='libx264', audio_codec='aac', fps=25, preset='veryfast')
+        with span("encode", cat="render", renderer="moviepy"):
+            video.write_videofile(OUTPUT_FILE_NAME, codec='libx264', audio_codec='aac', fps=25, preset='veryfast')
         
     finally:
+        # Release the ffmpeg readers before their files go away
+        if lazy_background is not None:
+            lazy_background.close()
+        for clip in visual_clips + audio_clips:
+            clip.close()
         # Clean up downloaded files
         for temp_file in temp_files:
             try:
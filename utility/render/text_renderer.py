@@ -0,0 +1,68 @@
+from functools import lru_cache
+
+# Tried in order when the requested font is not installed under its own name
+FALLBACK_FONTS = [
+    "arial.ttf",
+    "Arial.ttf",
+    "/Library/Fonts/Arial.ttf",
+    r"C:\Windows\Fonts\arial.ttf",
+    "LiberationSans-Regular.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+]
+
+# Number of distinct rendered captions kept in memory
+TEXT_IMAGE_CACHE_SIZE = 512
+
+# Caption look and vertical position shared by the render backends
+CAPTION_STYLE = {
+    "font": "Arial",
+    "fontsize": 100,
+    "color": "white",
+    "stroke_width": 3,
+    "stroke_color": "black",
+}
+CAPTION_Y = 800
+
+
+@lru_cache(maxsize=32)
+def load_font(font="Arial", fontsize=100):
+    from PIL import ImageFont
+    for candidate in [font] + FALLBACK_FONTS:
+        try:
+            return ImageFont.truetype(candidate, fontsize)
+        except OSError:
+            continue
+    print(f"Warning: Font {font} not found, using Pillow's default font")
+    return ImageFont.load_default(size=fontsize)
+
+
+@lru_cache(maxsize=TEXT_IMAGE_CACHE_SIZE)
+def render_text_image(text, font="Arial", fontsize=100, color="white", stroke_width=3, stroke_color="black"):
+    """Rasterize a caption to a read-only RGBA array.
+
+    Matches the ImageMagick label: output, a tight box around the stroked text
+    with a line-height tall canvas. Results are cached per parameter set, so
+    repeated captions are only drawn once.
+    """
+    import numpy as np
+    from PIL import Image, ImageDraw
+    pil_font = load_font(font, fontsize)
+    ascent, descent = pil_font.getmetrics()
+    left, _, right, _ = pil_font.getbbox(text, stroke_width=stroke_width)
+    width = max(1, right - left)
+    height = ascent + descent + 2 * stroke_width
+
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.text((-left, stroke_width), text, font=pil_font, fill=color,
+              stroke_width=stroke_width, stroke_fill=stroke_color)
+
+    frame = np.asarray(image)
+    frame.setflags(write=False)
+    return frame
+
+
+def clear_text_image_cache():
+    render_text_image.cache_clear()
@@ -1,17 +1,12 @@
 
-import os
 import json
-from openai import OpenAI
-
-# Determine client and model
-if len(os.environ.get("GROQ_API_KEY") or "") > 30:
-    from groq import Groq
-    # model = "llama3-70b-8192"
-    model  = "llama-3.3-70b-versatile"
-    client = Groq(api_key=os.environ["GROQ_API_KEY"])
-else:
-    model = "gpt-4o"
-    client = OpenAI(api_key=os.environ["OPENAI_KEY"])
+from utility.llm_cache import cached_completion
+from utility.providers import GROQ_MODEL, chat_completion, use_groq
+
+OPENAI_MODEL = "gpt-4o"
+
+def script_model():
+    return GROQ_MODEL if use_groq() else OPENAI_MODEL
 
 def generate_script(topic):
     prompt = (
@@ -29,16 +24,21 @@ def generate_script(topic):
         """
     )
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
+    # The parse step also runs on cached responses, so a bad entry is refetched
+    script, _, from_cache = cached_completion(
+        chat_completion,
+        script_model(),
+        [
             {"role": "system", "content": prompt},
             {"role": "user", "content": topic}
-        ]
+        ],
+        parse=parse_script,
     )
+    if from_cache:
+        print("Using cached script response")
+    return script
 
-    content = response.choices[0].message.content.strip()
-
+def parse_script(content):
     # 🔧 Clean up: remove code fences and invalid characters
     if content.startswith("```json") or content.startswith("```"):
         content = content.split("```")[-1].strip()
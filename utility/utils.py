@@ -1,6 +1,14 @@
 import os
+import gzip
+import queue
+import atexit
+import shutil
+import threading
+import time
 from datetime import datetime
+from contextlib import contextmanager
 import json
+import sqlite3
 
 # Log types
 LOG_TYPE_GPT = "GPT"
@@ -10,6 +18,179 @@ LOG_TYPE_PEXEL = "PEXEL"
 DIRECTORY_LOG_GPT = ".logs/gpt_logs"
 DIRECTORY_LOG_PEXEL = ".logs/pexel_logs"
 
+# Logger settings, overridable from the environment. LOG_MAX_PAYLOAD_CHARS=0
+# keeps responses whole; LOG_COMPRESS=1 gzips rotated files.
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+LOG_BATCH_SIZE = 256
+LOG_FLUSH_INTERVAL = float(os.environ.get("LOG_FLUSH_INTERVAL", 1.0))
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 50 * 1024 ** 2))
+LOG_ROTATE_SECONDS = int(os.environ.get("LOG_ROTATE_SECONDS", 24 * 3600))
+LOG_MAX_PAYLOAD_CHARS = int(os.environ.get("LOG_MAX_PAYLOAD_CHARS", 0))
+LOG_COMPRESS = os.environ.get("LOG_COMPRESS", "0") == "1"
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+class JsonlLogger:
+    """Append-only JSONL log written by a background thread.
+
+    log() only puts the entry on a bounded queue, so callers never wait on
+    the disk; when the queue is full the entry is dropped and counted
+    instead. The writer serializes entries in batches, flushes at least every
+    flush_interval seconds and rotates the file once it passes max_bytes or
+    rotate_seconds, renaming it with a microsecond timestamp (and gzipping it
+    if compress is set). Each process writes its own file, named with its
+    pid, so a rotation never moves a file another process is appending to.
+    """
+
+    def __init__(self, directory, name, queue_size=LOG_QUEUE_SIZE, flush_interval=LOG_FLUSH_INTERVAL,
+                 max_bytes=LOG_MAX_BYTES, rotate_seconds=LOG_ROTATE_SECONDS,
+                 max_payload_chars=LOG_MAX_PAYLOAD_CHARS, compress=LOG_COMPRESS):
+        self.path = os.path.join(directory, f"{name}.{os.getpid()}.jsonl")
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.max_payload_chars = max_payload_chars
+        self.compress = compress
+        self.stats = {"written": 0, "dropped": 0, "rotations": 0}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._opened = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"log-{name}", daemon=True)
+        self._thread.start()
+
+    def log(self, entry):
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += 1
+
+    def flush(self, timeout=5.0):
+        """Wait until everything logged so far is on disk"""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        self.flush(timeout)
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _run(self):
+        running = True
+        while running:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = []
+            markers = []
+            for item in batch:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    lines.append(self._serialize(item))
+            try:
+                if lines:
+                    self._write("".join(lines))
+                    with self._lock:
+                        self.stats["written"] += len(lines)
+            except Exception as e:
+                print(f"Warning: Failed to write log {self.path}: {e}")
+            for marker in markers:
+                marker.set()
+        self._close_file()
+
+    def _serialize(self, entry):
+        if self.max_payload_chars and "response" in entry:
+            response = entry["response"]
+            text = response if isinstance(response, str) else json.dumps(response)
+            if len(text) > self.max_payload_chars:
+                entry = dict(entry, response=text[:self.max_payload_chars], response_truncated=len(text))
+        return json.dumps(entry) + "\n"
+
+    def _write(self, data):
+        if self._file is not None and (self._file.tell() >= self.max_bytes or
+                                       time.time() - self._opened >= self.rotate_seconds):
+            self._rotate()
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._opened = time.time()
+            if self._file.tell():
+                # Appending to a log from an earlier run, age it from its first entry
+                self._opened = self._first_entry_time() or self._opened
+        self._file.write(data)
+        self._file.flush()
+
+    def _first_entry_time(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return datetime.fromisoformat(json.loads(f.readline())["timestamp"]).timestamp()
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _rotate(self):
+        self._close_file()
+        base = self.path[:-len(".jsonl")]
+        rotated = f"{base}.{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl"
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+        with self._lock:
+            self.stats["rotations"] += 1
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def get_logger(log_type):
+    """Process-wide logger for a log type, started on first use"""
+    with _loggers_lock:
+        if log_type not in _loggers:
+            if log_type == LOG_TYPE_GPT:
+                _loggers[log_type] = JsonlLogger(DIRECTORY_LOG_GPT, "gpt")
+            elif log_type == LOG_TYPE_PEXEL:
+                _loggers[log_type] = JsonlLogger(DIRECTORY_LOG_PEXEL, "pexel")
+            else:
+                raise ValueError(f"Unknown log type: {log_type}")
+        return _loggers[log_type]
+
+
+@atexit.register
+def close_loggers():
+    with _loggers_lock:
+        loggers = list(_loggers.values())
+        _loggers.clear()
+    for logger in loggers:
+        logger.close()
+
+
 # method to log response from pexel and openai
 def log_response(log_type, query,response):
     log_entry = {
@@ -17,18 +198,14 @@ def log_response(log_type, query,response):
         "response": response,
         "timestamp": datetime.now().isoformat()
     }
-    if log_type == LOG_TYPE_GPT:
-        if not os.path.exists(DIRECTORY_LOG_GPT):
-            os.makedirs(DIRECTORY_LOG_GPT)
-        filename = '{}_gpt3.txt'.format(datetime.now().strftime("%Y%m%d_%H%M%S"))
-        filepath = os.path.join(DIRECTORY_LOG_GPT, filename)
-        with open(filepath, "w") as outfile:
-            outfile.write(json.dumps(log_entry) + '\n')
-
-    if log_type == LOG_TYPE_PEXEL:
-        if not os.path.exists(DIRECTORY_LOG_PEXEL):
-            os.makedirs(DIRECTORY_LOG_PEXEL)
-        filename = '{}_pexel.txt'.format(datetime.now().strftime("%Y%m%d_%H%M%S"))
-        filepath = os.path.join(DIRECTORY_LOG_PEXEL, filename)
-        with open(filepath, "w") as outfile:
-            outfile.write(json.dumps(log_entry) + '\n')
+    get_logger(log_type).log(log_entry)
+
+@contextmanager
+def sqlite_connection(db_path, timeout=30):
+    """SQLite connection that commits on success and is always closed"""
+    connection = sqlite3.connect(db_path, timeout=timeout)
+    try:
+        yield connection
+        connection.commit()
+    finally:
+        connection.close()
@@ -1,12 +1,26 @@
 import os
-import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utility.providers import get_provider
+from utility.profiling import span, run_in_context
 from utility.utils import log_response, LOG_TYPE_PEXEL
+from utility.video.footage_cache import get_file_key, get_footage_cache
+from utility.video.footage_index import get_footage_index
+from utility.video.search_cache import get_search_cache
 
 PEXELS_API_KEY = os.environ.get('PEXELS_KEY')
+PEXELS_API_URL = os.environ.get('PEXELS_API_URL', "https://api.pexels.com")
+# Searches in flight while resolving a video's segments, matching the Pexels provider's cap
+SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', 4))
+
+# search_candidates outcomes
+VIDEOS = "videos"
+UNSUITABLE = "unsuitable"
+NO_VIDEOS = "no_videos"
 
 
 def search_videos(query_string, orientation_landscape=False):
-    url = "https://api.pexels.com/videos/search"
+    url = f"{PEXELS_API_URL}/videos/search"
     headers = {
         "Authorization": PEXELS_API_KEY,
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -20,29 +34,32 @@ def search_videos(query_string, orientation_landscape=False):
         "max_duration": 20,
         "size": "large"
     }
-    response = requests.get(url, headers=headers, params=params)
-    json_data = response.json()
+    with span("pexels_search", cat="search", query=query_string) as info:
+        cache = get_search_cache()
+        if cache is not None:
+            cached = cache.get_response(params)
+            info["cached"] = cached is not None
+            if cached is not None:
+                return cached
+
+        response = get_provider("pexels").request("GET", url, headers=headers, params=params, timeout=30)
+        json_data = response.json()
     log_response(LOG_TYPE_PEXEL, query_string, json_data)
+    if cache is not None and response.ok:
+        cache.set_response(params, json_data)
+    index = get_footage_index()
+    if index is not None and response.ok:
+        index.add_videos(json_data.get('videos') or [])
     return json_data
 
 
-def getBestVideo(query_string, orientation_landscape=False, used_vids=None):
-    if used_vids is None:
-        used_vids = []
-
-    vids = search_videos(query_string, orientation_landscape)
-    if not vids.get('videos'):
-        print(f"No videos found for query: {query_string}")
-        return None
-
-    videos = vids['videos']
-
+def filter_videos(videos, orientation_landscape=False):
+    """Keep (video, file) pairs matching the target resolution, aspect ratio, duration and HD"""
     # Define target dimensions
     target_w, target_h = (1920, 1080) if orientation_landscape else (1080, 1920)
     target_ratio = target_w / target_h
     ratio_tolerance = 0.05
 
-    # Filter videos by resolution, aspect ratio, duration, and HD
     filtered_videos = []
     for video in videos:
         if video['width'] < target_w or video['height'] < target_h:
@@ -57,22 +74,56 @@ def getBestVideo(query_string, orientation_landscape=False, used_vids=None):
         # Pick the largest HD file
         best_file = max(hd_files, key=lambda f: f['width'] * f['height'])
         filtered_videos.append((video, best_file))
+    return filtered_videos
+
+
+def select_rendition(video_files, target_w, target_h):
+    """Smallest MP4 file at least target_w x target_h, or None if there is none"""
+    large_enough = [f for f in video_files
+                    if f.get('file_type', 'video/mp4') == 'video/mp4' and f.get('width') and f.get('height')
+                    and f['width'] >= target_w and f['height'] >= target_h]
+    if not large_enough:
+        return None
+    return min(large_enough, key=lambda f: f['width'] * f['height'])
+
+
+def alternative_queries(query_string):
+    """Broader queries to try when a search has no usable video"""
+    return [
+        f"cinematic {query_string}",
+        f"professional {query_string}",
+        f"beautiful {query_string}",
+        f"{query_string} scene",
+        f"{query_string} footage"
+    ]
+
 
+def search_candidates(query_string, orientation_landscape=False):
+    """Search once for query_string and rank what can be used.
+
+    Returns (VIDEOS, links) with links best first, (UNSUITABLE, []) when the
+    search had results but none usable, so alternatives should be tried, or
+    (NO_VIDEOS, []) when it had no results at all.
+    """
+    # Define target dimensions
+    target_w, target_h = (1920, 1080) if orientation_landscape else (1080, 1920)
+
+    cache = get_search_cache()
+    if cache is not None and cache.is_unsuitable(query_string, orientation_landscape):
+        # A recent search already had nothing usable, go straight to the alternatives
+        print(f"No suitable quality videos found for query: {query_string}")
+        return UNSUITABLE, []
+
+    vids = search_videos(query_string, orientation_landscape)
+    if not vids.get('videos'):
+        print(f"No videos found for query: {query_string}")
+        return NO_VIDEOS, []
+    filtered_videos = filter_videos(vids['videos'], orientation_landscape)
     if not filtered_videos:
         print(f"No suitable quality videos found for query: {query_string}")
-        # Try alternative queries
-        alternative_queries = [
-            f"cinematic {query_string}",
-            f"professional {query_string}",
-            f"beautiful {query_string}",
-            f"{query_string} scene",
-            f"{query_string} footage"
-        ]
-        for alt_query in alternative_queries:
-            url = getBestVideo(alt_query, orientation_landscape, used_vids)
-            if url:
-                return url
-        return None
+        if cache is not None:
+            cache.mark_unsuitable(query_string, orientation_landscape)
+        return UNSUITABLE, []
 
     # Sort by duration closeness to 15s and resolution
     def quality_score(item):
@@ -82,39 +133,189 @@ def getBestVideo(query_string, orientation_landscape=False, used_vids=None):
         return duration_score + 0.5 * res_score
 
     sorted_videos = sorted(filtered_videos, key=quality_score, reverse=True)
+    # Each video in the smallest rendition that still covers the target size,
+    # so less is downloaded and decoded
+    return VIDEOS, [(select_rendition(video['video_files'], target_w, target_h) or file)['link']
+                    for video, file in sorted_videos]
+
+
+def local_candidates(query_string, orientation_landscape=False):
+    """Links of indexed videos matching query_string that are already in the footage cache, best first"""
+    index = get_footage_index()
+    if index is None:
+        return []
+    target_w, target_h = (1920, 1080) if orientation_landscape else (1080, 1920)
+    footage_cache = get_footage_cache()
+    links = []
+    for video, _ in filter_videos(index.search(query_string), orientation_landscape):
+        cached_files = [f for f in video['video_files'] if footage_cache.contains(f['link'])]
+        file = select_rendition(cached_files, target_w, target_h)
+        if file:
+            links.append(file['link'])
+    index.count("hits" if links else "misses")
+    return links
+
+
+def pick_video(query_string, used_vids, candidates, local=None):
+    """First link for query_string not in used_vids, trying alternative queries if its results are unsuitable.
+
+    local(query), if given, returns links already on disk, which are
+    preferred to candidates(query), the result of search_candidates(query).
+    The picked video's key is added to used_vids.
+    """
+    for link in local(query_string) if local else []:
+        file_key = get_file_key(link)
+        if file_key not in used_vids:
+            used_vids.append(file_key)
+            return link
+
+    kind, links = candidates(query_string)
+    if kind == UNSUITABLE:
+        for alt_query in alternative_queries(query_string):
+            url = pick_video(alt_query, used_vids, candidates, local)
+            if url:
+                return url
+        return None
 
     # Pick first unused video
-    for video, file in sorted_videos:
-        file_key = file['link'].split('.hd')[0]
+    for link in links:
+        file_key = get_file_key(link)
         if file_key not in used_vids:
             used_vids.append(file_key)
-            return file['link']
+            return link
 
-    print(f"No unused videos found for query: {query_string}")
+    if kind == VIDEOS:
+        print(f"No unused videos found for query: {query_string}")
     return None
 
 
-def generate_video_url(timed_video_searches,orientation_landscape, video_server="pexel"):
-    timed_video_urls = []
-    if video_server == "pexel":
+def getBestVideo(query_string, orientation_landscape=False, used_vids=None):
+    if used_vids is None:
+        used_vids = []
+    return pick_video(query_string, used_vids, lambda query: search_candidates(query, orientation_landscape),
+                      lambda query: local_candidates(query, orientation_landscape))
+
+
+def prefetch_candidates(query_groups, orientation_landscape=False, max_workers=SEARCH_WORKERS, local=None):
+    """Run the searches for many segments concurrently, returning {query: search_candidates(query)}.
+
+    query_groups holds each segment's queries in the order they are tried.
+    Every segment's first query is searched at once, a segment's next query
+    only after the previous one found nothing, and the alternatives of a
+    query whose results are unsuitable all at once, each dropped before it
+    starts if an earlier alternative has already found videos. Queries with
+    footage on disk, as returned by local(query), aren't searched. Anything
+    not searched here, such as a fallback needed because every video found
+    was already used, is searched when picking.
+    """
+    results = {}
+    pending = {}
+    groups_of = {}
+    queue = deque()
+
+    def register(queries):
+        for index, query in enumerate(queries):
+            groups_of.setdefault(query, []).append((queries, index))
+
+    def found(query):
+        return results.get(query, (None,))[0] == VIDEOS or bool(local and local(query))
+
+    def needed(query):
+        if query in results or query in pending.values() or (local and local(query)):
+            return False
+        return any(not any(found(earlier) for earlier in queries[:index]) for queries, index in groups_of[query])
+
+    for queries in query_groups:
+        register(queries)
+    segment_queries = set(groups_of)
+    queue.extend(queries[0] for queries in query_groups if queries)
+
+    search = run_in_context(lambda query: search_candidates(query, orientation_landscape))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while queue or pending:
+            while queue and len(pending) < max_workers:
+                query = queue.popleft()
+                if needed(query):
+                    pending[executor.submit(search, query)] = query
+            if not pending:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                query = pending.pop(future)
+                kind, _ = results[query] = future.result()
+                if query not in segment_queries:
+                    continue
+                if kind == UNSUITABLE:
+                    alternatives = alternative_queries(query)
+                    register(alternatives)
+                    queue.extendleft(reversed(alternatives))
+                elif kind == NO_VIDEOS:
+                    queue.extendleft(queries[index + 1] for queries, index in groups_of[query]
+                                     if index + 1 < len(queries) and queries in query_groups)
+    return results
+
+
+def resolve_videos(query_groups, orientation_landscape=False, used_links=None):
+    """A video link, or None, for each group of queries tried in order, never reusing one in used_links.
+
+    The searches run concurrently, then videos are assigned one group at a
+    time in order, so the result doesn't depend on which search finished
+    first. Keys of the picked videos are added to used_links.
+    """
+    if used_links is None:
         used_links = []
-        for (t1, t2), search_terms in timed_video_searches:
-            url = None
-            if isinstance(search_terms, list):
-                for query in search_terms:
-                    url = getBestVideo(query, orientation_landscape, used_vids=used_links)
-                    if url:
-                        used_links.append(url.split('.hd')[0])
-                        break
-            else:
-                url = getBestVideo(search_terms, orientation_landscape, used_vids=used_links)
-                if url:
-                    used_links.append(url.split('.hd')[0])
 
+    # Look up the local index once per query, so footage downloaded
+    # meanwhile can't change the assignment
+    on_disk = {}
+
+    def local(query):
+        if query not in on_disk:
+            on_disk[query] = local_candidates(query, orientation_landscape)
+        return on_disk[query]
+
+    found = prefetch_candidates(query_groups, orientation_landscape, local=local)
+
+    def candidates(query):
+        if query not in found:
+            found[query] = search_candidates(query, orientation_landscape)
+        return found[query]
+
+    urls = []
+    for queries in query_groups:
+        url = None
+        for query in queries:
+            url = pick_video(query, used_links, candidates, local)
+            if url:
+                break
+        urls.append(url)
+    return urls
+
+
+def print_search_stats():
+    cache = get_search_cache()
+    if cache is not None:
+        stats = cache.get_stats()
+        print(f"Search cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['negative_hits']} negative hits, {stats['api_calls_saved']} API calls saved")
+    index = get_footage_index()
+    if index is not None:
+        stats = index.get_stats()
+        print(f"Footage index: {stats['hits']} queries served from local footage, {stats['misses']} misses")
+
+
+def generate_video_url(timed_video_searches,orientation_landscape, video_server="pexel", used_links=None):
+    timed_video_urls = []
+    if video_server == "pexel":
+        query_groups = [search_terms if isinstance(search_terms, list) else [search_terms]
+                        for _, search_terms in timed_video_searches]
+        urls = resolve_videos(query_groups, orientation_landscape, used_links)
+        for ((t1, t2), _), url in zip(timed_video_searches, urls):
             if url:
                 timed_video_urls.append([[t1, t2], url])
             else:
                 print(f"Warning: Could not find suitable video for time segment {t1}-{t2}")
+        print_search_stats()
     else:
         from some_module import get_images_for_video  # Replace with your actual function
         timed_video_urls = get_images_for_video(timed_video_searches)
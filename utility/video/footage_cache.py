@@ -0,0 +1,146 @@
+import os
+import re
+import time
+import hashlib
+import tempfile
+import threading
+
+# Cache directory and size bound, overridable from the environment
+FOOTAGE_CACHE_DIR = os.environ.get("FOOTAGE_CACHE_DIR", ".cache/footage")
+FOOTAGE_CACHE_MAX_BYTES = int(os.environ.get("FOOTAGE_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+
+# Files used this recently are never evicted, another process may be about to read them
+EVICTION_GRACE_SECONDS = 600
+# Partial downloads left behind by crashed processes are removed after this long
+STALE_PART_SECONDS = 24 * 3600
+# Name of a published entry: the sha256 of its key
+ENTRY_NAME = re.compile(r"[0-9a-f]{64}\.mp4")
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_file_key(link):
+    """Normalized key for a Pexels file link, shared by every rendition of a video"""
+    return link.split('.hd')[0]
+
+
+def is_cache_entry(path):
+    """Whether path is a published cache entry, whose content is fixed by its name.
+
+    Reads refresh an entry's mtime, so its name and size identify it and its mtime does not.
+    """
+    return bool(ENTRY_NAME.fullmatch(os.path.basename(path)))
+
+
+class FootageCache:
+    """Content-addressed store of downloaded clips with size-bounded LRU eviction.
+
+    Entries are named after a hash of the normalized file link. Writes go to a
+    temporary file in the cache directory and are published with os.replace, so
+    concurrent processes only ever see complete files. Reads refresh the file
+    mtime, which is what eviction orders by.
+    """
+
+    def __init__(self, directory=FOOTAGE_CACHE_DIR, max_bytes=FOOTAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes_downloaded": 0}
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, link):
+        digest = hashlib.sha256(get_file_key(link).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".mp4")
+
+    def contains(self, link):
+        return os.path.exists(self.path_for(link))
+
+    def get(self, link):
+        """Return the cached path for link, or None on a miss"""
+        path = self.path_for(link)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return path
+
+    def put(self, link, write):
+        """Store a clip by calling write(temp_path), then publish it atomically"""
+        path = self.path_for(link)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        os.close(fd)
+        try:
+            write(temp_path)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self._count("bytes_downloaded", size)
+        self.evict(keep=path)
+        return path
+
+    def fetch(self, link, download):
+        """Return a local path for link, calling download(link, filename) on a miss"""
+        path = self.get(link)
+        if path:
+            return path
+        return self.put(link, lambda temp_path: download(link, temp_path))
+
+    def evict(self, keep=None):
+        """Remove least recently used clips until the cache fits in max_bytes"""
+        now = time.time()
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.endswith(".part"):
+                if now - stat.st_mtime > STALE_PART_SECONDS:
+                    self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep or now - mtime < EVICTION_GRACE_SECONDS:
+                continue
+            if self._remove(path):
+                total -= size
+                self._count("evictions")
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+def get_footage_cache():
+    """Process-wide footage cache using the configured directory and size"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = FootageCache()
+        return _default_cache
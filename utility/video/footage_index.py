@@ -0,0 +1,163 @@
+import os
+import re
+import sys
+import gzip
+import json
+import math
+import time
+import threading
+from collections import Counter
+from utility.utils import sqlite_connection
+
+# Set FOOTAGE_INDEX_DB to an empty string to disable the index
+FOOTAGE_INDEX_DB = os.environ.get("FOOTAGE_INDEX_DB", ".cache/footage_index.sqlite")
+FOOTAGE_INDEX_MAX_RESULTS = 50
+
+# Words that say nothing about what is in a clip
+STOPWORDS = {
+    "a", "an", "and", "at", "by", "for", "from", "in", "into", "is", "it", "of", "on", "or", "over", "the",
+    "to", "under", "up", "with", "video", "footage", "clip", "stock",
+}
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Lowercase words of text without stopwords or numbers, plurals folded to the singular"""
+    tokens = []
+    for word in re.findall(r"[a-z]+", text.lower()):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def video_text(video):
+    """Searchable text of a Pexels video: the slug of its page URL and its tags"""
+    slug = (video.get("url") or "").rstrip("/").rsplit("/", 1)[-1]
+    tags = [tag if isinstance(tag, str) else tag.get("name", "") for tag in video.get("tags") or []]
+    return " ".join([slug] + tags)
+
+
+class FootageIndex:
+    """Inverted index of Pexels videos seen in earlier search responses.
+
+    Each video is stored with its dimensions, duration and file renditions,
+    and indexed by the words of its page URL slug and tags. search() returns
+    the videos matching every word of a query, ranked by TF-IDF, in the same
+    shape as a Pexels response so they go through the usual filtering.
+    """
+
+    def __init__(self, db_path=FOOTAGE_INDEX_DB):
+        self.db_path = db_path
+        self.stats = {"hits": 0, "misses": 0, "indexed": 0}
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS videos (id INTEGER PRIMARY KEY, url TEXT, width INTEGER, "
+                       "height INTEGER, duration REAL, video_files TEXT NOT NULL, indexed REAL NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT NOT NULL, video_id INTEGER NOT NULL, "
+                       "count INTEGER NOT NULL, PRIMARY KEY (term, video_id)) WITHOUT ROWID")
+
+    def add_videos(self, videos):
+        """Index the videos of a Pexels search response, replacing earlier entries for the same ids"""
+        rows = []
+        for video in videos:
+            if not video.get("id") or not video.get("video_files"):
+                continue
+            rows.append((video, Counter(tokenize(video_text(video)))))
+        if not rows:
+            return
+        now = time.time()
+        with self._connect() as db:
+            for video, counts in rows:
+                db.execute("INSERT OR REPLACE INTO videos (id, url, width, height, duration, video_files, indexed) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (video["id"], video.get("url"), video.get("width"), video.get("height"),
+                            video.get("duration"), json.dumps(video["video_files"]), now))
+                db.execute("DELETE FROM terms WHERE video_id = ?", (video["id"],))
+                db.executemany("INSERT INTO terms (term, video_id, count) VALUES (?, ?, ?)",
+                               [(term, video["id"], count) for term, count in counts.items()])
+        self.count("indexed", len(rows))
+
+    def search(self, query_string, limit=FOOTAGE_INDEX_MAX_RESULTS):
+        """Indexed videos matching every word of query_string, best TF-IDF score first"""
+        terms = sorted(set(tokenize(query_string)))
+        if not terms:
+            return []
+        with self._connect() as db:
+            total = db.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+            scores = None
+            for term in terms:
+                postings = db.execute("SELECT video_id, count FROM terms WHERE term = ?", (term,)).fetchall()
+                idf = math.log(1 + total / max(1, len(postings)))
+                term_scores = {video_id: count * idf for video_id, count in postings}
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {video_id: score + term_scores[video_id] for video_id, score in scores.items()
+                              if video_id in term_scores}
+                if not scores:
+                    return []
+            best = sorted(scores, key=lambda video_id: (-scores[video_id], video_id))[:limit]
+            rows = db.execute("SELECT id, url, width, height, duration, video_files FROM videos "
+                              f"WHERE id IN ({', '.join('?' * len(best))})", best).fetchall()
+        videos = {row[0]: {"id": row[0], "url": row[1], "width": row[2], "height": row[3], "duration": row[4],
+                           "video_files": json.loads(row[5])} for row in rows}
+        return [videos[video_id] for video_id in best if video_id in videos]
+
+    def index_logs(self, directory):
+        """Index the responses in a directory of Pexels JSONL logs, returning how many were read"""
+        responses = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith((".jsonl", ".jsonl.gz")):
+                continue
+            path = os.path.join(directory, name)
+            opener = gzip.open if name.endswith(".gz") else open
+            with opener(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        response = json.loads(line).get("response")
+                    except ValueError:
+                        continue  # Torn last line of a crashed run
+                    if isinstance(response, dict) and response.get("videos"):
+                        self.add_videos(response["videos"])
+                        responses += 1
+        return responses
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _connect(self):
+        return sqlite_connection(self.db_path)
+
+
+def get_footage_index():
+    """Process-wide footage index, or None if FOOTAGE_INDEX_DB is empty"""
+    global _default_index
+    if not FOOTAGE_INDEX_DB:
+        return None
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = FootageIndex()
+        return _default_index
+
+
+if __name__ == "__main__":
+    # Backfill the index from responses logged before it existed
+    log_dir = sys.argv[1] if len(sys.argv) > 1 else ".logs/pexel_logs"
+    index = get_footage_index()
+    if index is None:
+        sys.exit("FOOTAGE_INDEX_DB is empty, the footage index is disabled")
+    print(f"Indexed {index.index_logs(log_dir)} responses from {log_dir} "
+          f"({index.get_stats()['indexed']} videos) into {index.db_path}")
@@ -0,0 +1,122 @@
+import threading
+from bisect import bisect_right
+from utility.audio.audio_generator import split_sentences
+from utility.profiling import span, run_in_context
+from utility.video.footage_cache import get_file_key
+
+
+def sentence_segments(script, timed_captions, count):
+    """Split the narration into count consecutive [t1, t2] segments along the sentences of script.
+
+    With one segment per sentence each segment is a sentence; otherwise the
+    script is cut into count runs of about equal word count. Each cut is
+    timed by its word position in the captions, interpolating within the
+    caption it falls in.
+    """
+    sentences = split_sentences(script)
+    script_words = sum(len(sentence.split()) for sentence in sentences)
+    if count == len(sentences):
+        cuts = []
+        for sentence in sentences[:-1]:
+            cuts.append((cuts[-1] if cuts else 0) + len(sentence.split()))
+    else:
+        cuts = [round(script_words * n / count) for n in range(1, count)]
+
+    caption_words = []
+    words = 0
+    for _, text in timed_captions:
+        caption_words.append(words)
+        words += len(text.split())
+
+    def time_at(word):
+        # Whisper may hear a few words differently, so scale to the caption word count
+        word = word * words / max(1, script_words)
+        index = max(0, bisect_right(caption_words, word) - 1)
+        (t1, t2), text = timed_captions[index]
+        return t1 + (t2 - t1) * min(1.0, (word - caption_words[index]) / max(1, len(text.split())))
+
+    times = [0.0] + [time_at(cut) for cut in cuts] + [timed_captions[-1][0][1]]
+    return [[t1, t2] for t1, t2 in zip(times, times[1:])]
+
+
+class FootagePrefetch:
+    """Footage for a script, searched and downloaded before the narration is timed.
+
+    One untimed LLM call gives a keyword per sentence, and their videos are
+    resolved and fetched into the footage cache on a background thread while
+    TTS and captioning run. Once captions exist, timed_video_urls() lays the
+    videos on the timeline in sentence order and looks up any sentence left
+    without one the usual way. A job that ends without using the prefetch
+    calls close(), which stops it after its current step.
+    """
+
+    def __init__(self, script, orientation_landscape=False):
+        self.script = script
+        self.orientation_landscape = orientation_landscape
+        self.keywords = None
+        self.urls = None
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=run_in_context(self._run), name="footage-prefetch", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Stop the prefetch after its current step and wait for its thread"""
+        self._cancelled.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        from utility.video.video_search_query_generator import getVideoSearchKeywords
+        from utility.video.background_video_generator import resolve_videos, print_search_stats
+        from utility.render.render_engine import fetch_background_videos
+        try:
+            with span("prefetch", cat="search"):
+                self.keywords = getVideoSearchKeywords(self.script)
+                if not self.keywords or self._cancelled.is_set():
+                    return
+                self.urls = resolve_videos([[keyword] for keyword in self.keywords], self.orientation_landscape)
+                print_search_stats()
+                if self._cancelled.is_set():
+                    return
+                # Into the footage cache, where the download stage will find them
+                fetch_background_videos([url for url in self.urls if url], [])
+        except Exception as e:
+            print(f"Warning: Footage prefetch failed: {str(e)}")
+
+    def timed_video_urls(self, timed_captions):
+        """[[t1, t2], url] covering the narration, or None if no footage was found for it"""
+        from utility.video.video_search_query_generator import getVideoSearchQueriesTimed
+        from utility.video.background_video_generator import generate_video_url
+
+        self._thread.join()
+        if not self.keywords or not self.urls or not any(self.urls) or not timed_captions:
+            return None
+
+        used_links = [get_file_key(url) for url in self.urls if url]
+        timed_video_urls = []
+        for (t1, t2), url in zip(sentence_segments(self.script, timed_captions, len(self.keywords)), self.urls):
+            if t2 <= t1:
+                continue
+            if url:
+                timed_video_urls.append([[t1, t2], url])
+                continue
+
+            # Nothing found for this sentence: ask for timed keywords for just its captions
+            print(f"No prefetched video for segment {t1}-{t2}, searching again")
+            captions = [caption for caption in timed_captions if caption[0][0] < t2 and caption[0][1] > t1]
+            search_terms = getVideoSearchQueriesTimed(self.script, captions) or []
+            found = generate_video_url([[[max(t1, s1), min(t2, s2)], terms] for (s1, s2), terms in search_terms
+                                        if s1 < t2 and s2 > t1],
+                                       self.orientation_landscape, used_links=used_links)
+            timed_video_urls.extend(found or [])
+
+        # Stretch each clip over any unresolved segments after it, and the first back to the start
+        timed_video_urls = [[interval, url] for interval, url in timed_video_urls if url]
+        if not timed_video_urls:
+            return None
+        ends = [interval[0] for interval, _ in timed_video_urls[1:]] + [timed_captions[-1][0][1]]
+        return [[[0.0 if n == 0 else t1, end], url]
+                for n, (((t1, _), url), end) in enumerate(zip(timed_video_urls, ends))]
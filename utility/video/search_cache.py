@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from utility.utils import sqlite_connection
+
+# Defaults, overridable from the environment. Set SEARCH_CACHE_DB to an empty
+# string to keep the cache in memory only.
+SEARCH_CACHE_TTL = int(os.environ.get("SEARCH_CACHE_TTL", 24 * 3600))
+SEARCH_CACHE_NEGATIVE_TTL = int(os.environ.get("SEARCH_CACHE_NEGATIVE_TTL", 6 * 3600))
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", 1024))
+SEARCH_CACHE_DB = os.environ.get("SEARCH_CACHE_DB", ".cache/pexels_search.sqlite")
+
+UNSUITABLE = "unsuitable"
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+_cache_disabled = False
+
+
+class SearchCache:
+    """TTL cache for Pexels search responses.
+
+    Lookups go to an in-memory LRU first and then to an optional SQLite file
+    shared between processes. Besides raw responses it records the negative
+    outcome of a query whose results had no usable video, so getBestVideo can
+    skip straight to its alternative queries.
+    """
+
+    def __init__(self, max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl=SEARCH_CACHE_TTL,
+                 negative_ttl=SEARCH_CACHE_NEGATIVE_TTL, db_path=SEARCH_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.db_path = db_path or None
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "api_calls_saved": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.db_path:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            with self._connect() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS search_cache "
+                           "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+
+    @staticmethod
+    def make_key(params):
+        return json.dumps(params, sort_keys=True)
+
+    def get_response(self, params):
+        """Return a cached search response for params, or None"""
+        value = self._get(self.make_key(params))
+        with self._lock:
+            if value is None:
+                self.stats["misses"] += 1
+            else:
+                self.stats["hits"] += 1
+                self.stats["api_calls_saved"] += 1
+        return value
+
+    def set_response(self, params, response):
+        ttl = self.ttl if response.get('videos') else self.negative_ttl
+        self._set(self.make_key(params), response, ttl)
+
+    def is_unsuitable(self, query_string, orientation_landscape):
+        """True if a recent search for this query had no usable video"""
+        unsuitable = self._get(self._unsuitable_key(query_string, orientation_landscape)) is not None
+        if unsuitable:
+            with self._lock:
+                self.stats["negative_hits"] += 1
+                self.stats["api_calls_saved"] += 1
+        return unsuitable
+
+    def mark_unsuitable(self, query_string, orientation_landscape):
+        self._set(self._unsuitable_key(query_string, orientation_landscape), UNSUITABLE, self.negative_ttl)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            with self._connect() as db:
+                db.execute("DELETE FROM search_cache")
+
+    @staticmethod
+    def _unsuitable_key(query_string, orientation_landscape):
+        return json.dumps([UNSUITABLE, query_string, bool(orientation_landscape)])
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        if not self.db_path:
+            return None
+        with self._connect() as db:
+            row = db.execute("SELECT value, expires FROM search_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        value = json.loads(row[0])
+        self._remember(key, value, row[1])
+        return value
+
+    def _set(self, key, value, ttl):
+        expires = time.time() + ttl
+        self._remember(key, value, expires)
+        if self.db_path:
+            with self._connect() as db:
+                db.execute("INSERT OR REPLACE INTO search_cache (key, value, expires) VALUES (?, ?, ?)",
+                           (key, json.dumps(value), expires))
+                db.execute("DELETE FROM search_cache WHERE expires <= ?", (time.time(),))
+
+    def _remember(self, key, value, expires):
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _connect(self):
+        return sqlite_connection(self.db_path)
+
+
+def get_search_cache():
+    """Process-wide search cache, or None if caching was disabled"""
+    global _default_cache
+    with _default_cache_lock:
+        if _cache_disabled:
+            return None
+        if _default_cache is None:
+            _default_cache = SearchCache()
+        return _default_cache
+
+
+def set_search_cache(cache):
+    """Replace the process-wide search cache; pass None to disable caching"""
+    global _default_cache, _cache_disabled
+    with _default_cache_lock:
+        _default_cache = cache
+        _cache_disabled = cache is None
@@ -1,21 +1,13 @@
-from openai import OpenAI
-import os
 import json
 import re
-from datetime import datetime
 from utility.utils import log_response,LOG_TYPE_GPT
+from utility.llm_cache import cached_completion
+from utility.providers import GROQ_MODEL, chat_completion, use_groq
 
-if len(os.environ.get("GROQ_API_KEY")) > 30:
-    from groq import Groq
-    # model = "llama3-70b-8192"
-    model  = "llama-3.3-70b-versatile"
-    client = Groq(
-        api_key=os.environ.get("GROQ_API_KEY"),
-        )
-else:
-    model = "gpt-4"  # Fixed model name
-    OPENAI_API_KEY = os.environ.get('OPENAI_KEY')
-    client = OpenAI(api_key=OPENAI_API_KEY)
+OPENAI_MODEL = "gpt-4"  # Fixed model name
+
+def search_model():
+    return GROQ_MODEL if use_groq() else OPENAI_MODEL
 
 log_directory = ".logs/gpt_logs"
 
@@ -50,6 +42,21 @@ Guidelines for keywords:
 Your response must be ONLY the JSON array, nothing else.
 """
 
+keywords_prompt = """# Instructions
+
+Given a video script, generate one search keyword for a background video per sentence, before the narration is timed. Follow these rules:
+
+1. Give exactly one keyword per sentence, in the order of the sentences
+2. Keywords must be:
+   - In English and visually concrete (e.g., "running cheetah", not "speed")
+   - Highly specific and detailed (e.g., "aerial view mountain lake" instead of just "mountain")
+   - Related to what the sentence says
+   - Diverse to avoid repetition
+3. Format must be a valid JSON array of strings: ["keyword1", "keyword2", ...]
+
+Your response must be ONLY the JSON array, nothing else.
+"""
+
 def clean_json_string(json_str):
     """Clean and validate JSON string"""
     # Remove any non-JSON content
@@ -140,6 +147,37 @@ def getVideoSearchQueriesTimed(script, captions_timed):
         print(f"Error in video search query generation: {str(e)}")
         return None
 
+def parse_keyword_list(content):
+    """The JSON array of keyword strings in an LLM response"""
+    start = content.find('[')
+    end = content.rfind(']') + 1
+    if start == -1 or end == 0:
+        raise ValueError("No valid JSON array found")
+    keywords = json.loads(content[start:end])
+    if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+        raise ValueError("Keywords must be a list of strings")
+    return keywords
+
+def getVideoSearchKeywords(script):
+    """One visual keyword per sentence of script, in order, without caption timings"""
+    try:
+        keywords, text, from_cache = cached_completion(
+            chat_completion,
+            search_model(),
+            [
+                {"role": "system", "content": keywords_prompt},
+                {"role": "user", "content": f"Script: {script}"}
+            ],
+            parse=parse_keyword_list,
+            temperature=0.7,
+        )
+        if not from_cache:
+            log_response(LOG_TYPE_GPT, script, text)
+        return keywords
+    except Exception as e:
+        print(f"Error in untimed video search keyword generation: {str(e)}")
+        return None
+
 def call_OpenAI(script, captions_timed):
     user_content = f"""Script: {script}
 Timed Captions: {json.dumps(captions_timed)}"""
@@ -147,19 +185,22 @@ Timed Captions: {json.dumps(captions_timed)}"""
     print("Sending request with content:", user_content)
     
     try:
-        response = client.chat.completions.create(
-            model=model,
-            temperature=0.7,  # Lower temperature for more consistent formatting
-            messages=[
+        # Responses are validated with clean_json_string before being cached
+        # and again when served from the cache
+        _, text, from_cache = cached_completion(
+            chat_completion,
+            search_model(),
+            [
                 {"role": "system", "content": prompt},
                 {"role": "user", "content": user_content}
-            ]
+            ],
+            parse=clean_json_string,
+            temperature=0.7,  # Lower temperature for more consistent formatting
         )
-        
-        text = response.choices[0].message.content.strip()
         print("Received response:", text)
         
-        log_response(LOG_TYPE_GPT, script, text)
+        if not from_cache:
+            log_response(LOG_TYPE_GPT, script, text)
         return text
     except Exception as e:
         print(f"API call error: {str(e)}")